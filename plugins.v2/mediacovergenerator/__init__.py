@@ -1,6 +1,6 @@
-import base64
 import datetime
 import hashlib
+import json
 import os
 import re
 import threading
@@ -10,7 +10,6 @@ import random
 from pathlib import Path
 from urllib.parse import urlparse
 from typing import Any, Dict, List, Optional, Tuple
-from collections import defaultdict
 
 import pytz
 import yaml
@@ -30,6 +29,14 @@ from app.schemas.types import EventType
 from app.schemas import ServiceInfo
 from app.utils.http import RequestUtils
 from app.utils.url import UrlUtils
+from app.plugins.mediacovergenerator.catalogue import LIBRARY_CACHE_TTL, LibraryCatalogue
+from app.plugins.mediacovergenerator.coverhistory import CoverHistory
+from app.plugins.mediacovergenerator.fetcher import DOWNLOAD_CONCURRENCY, ImageFetcher
+from app.plugins.mediacovergenerator.fonts import font_cache, font_digest
+from app.plugins.mediacovergenerator.itemquery import QueryStats, expand_children, items_query, page_size
+from app.plugins.mediacovergenerator.pipeline import Pipeline
+from app.plugins.mediacovergenerator.postercache import POSTER_CACHE_SIZE, PosterCache
+from app.plugins.mediacovergenerator.transferqueue import LIBRARY_DEBOUNCE, DebounceQueue
 from app.plugins.mediacovergenerator.style_single_1 import create_style_single_1
 from app.plugins.mediacovergenerator.style_single_2 import create_style_single_2
 from app.plugins.mediacovergenerator.style_multi_1 import create_style_multi_1
@@ -112,6 +119,23 @@ class MediaCoverGenerator(_PluginBase):
     _color_ratio_multi_1 = 0.8
     _single_use_primary = False
     _multi_1_use_primary = True
+    _fast_blur = False
+    _output_format = 'webp'
+    _encode_preset = 'balanced'
+    _download_concurrency = DOWNLOAD_CONCURRENCY
+    _fetcher = None
+    _poster_cache_size = POSTER_CACHE_SIZE
+    _force_refresh = False
+    _library_cache_ttl = LIBRARY_CACHE_TTL
+    _library_debounce = LIBRARY_DEBOUNCE
+    _same_path = False
+    # 流水线上传线程与入库队列线程都会保存封面指纹
+    _fingerprint_lock = threading.Lock()
+    _library_catalogue = None
+    _cover_history = None
+    _transfer_queue = None
+    _library_queue = None
+    _pending_groups = None
 
     def __init__(self):
         super().__init__()
@@ -162,6 +186,27 @@ class MediaCoverGenerator(_PluginBase):
             self._color_ratio_multi_1 = config.get("color_ratio_multi_1")
             self._single_use_primary = config.get("single_use_primary")
             self._multi_1_use_primary = config.get("multi_1_use_primary")
+            self._fast_blur = config.get("fast_blur")
+            self._output_format = config.get("output_format") or "webp"
+            self._encode_preset = config.get("encode_preset") or "balanced"
+            self._download_concurrency = config.get("download_concurrency") or DOWNLOAD_CONCURRENCY
+            self._poster_cache_size = config.get("poster_cache_size") or POSTER_CACHE_SIZE
+            self._force_refresh = config.get("force_refresh")
+            self._library_cache_ttl = config.get("library_cache_ttl")
+            self._library_debounce = config.get("library_debounce")
+            self._same_path = config.get("same_path")
+
+        try:
+            library_cache_ttl = float(self._library_cache_ttl) * 60
+        except (TypeError, ValueError):
+            library_cache_ttl = LIBRARY_CACHE_TTL * 60
+        if self._library_catalogue:
+            # 配置变化后（如更换媒体服务器）重新获取媒体库列表
+            self._library_catalogue.ttl = library_cache_ttl
+            self._library_catalogue.invalidate()
+        else:
+            self._library_catalogue = LibraryCatalogue(ttl=library_cache_ttl)
+        self._cover_history = CoverHistory(self.clean_cover_history(save=False))
 
         if self._selected_servers:
             self._servers = self.mediaserver_helper.get_services(
@@ -178,6 +223,20 @@ class MediaCoverGenerator(_PluginBase):
 
         # 停止现有任务
         self.stop_service()
+        try:
+            poster_cache_bytes = int(float(self._poster_cache_size) * 1024 * 1024)
+        except (TypeError, ValueError):
+            poster_cache_bytes = POSTER_CACHE_SIZE * 1024 * 1024
+        self._transfer_queue = DebounceQueue(self.__handle_transfer_group, "transfer")
+        self._library_queue = DebounceQueue(self.__handle_library_group, "library")
+        self._fetcher = ImageFetcher(concurrency=self._download_concurrency,
+                                     cache=PosterCache(data_path / 'poster_cache', poster_cache_bytes))
+        # 保存配置时尚未处理的入库转入新的队列，按原来的时间继续处理
+        pending_groups, self._pending_groups = self._pending_groups, None
+        if pending_groups and any(pending_groups) and self._enabled and self._transfer_monitor:
+            self._transfer_queue.restore(pending_groups[0])
+            self._library_queue.restore(pending_groups[1])
+            logger.info(f"保留 {len(pending_groups[0]) + len(pending_groups[1])} 组尚未处理的入库封面更新")
 
         # 启动服务
         if self._onlyonce:
@@ -238,7 +297,16 @@ class MediaCoverGenerator(_PluginBase):
             "color_ratio": self._color_ratio,
             "color_ratio_multi_1": self._color_ratio_multi_1,
             "single_use_primary": self._single_use_primary,
-            "multi_1_use_primary": self._multi_1_use_primary
+            "multi_1_use_primary": self._multi_1_use_primary,
+            "fast_blur": self._fast_blur,
+            "output_format": self._output_format,
+            "encode_preset": self._encode_preset,
+            "download_concurrency": self._download_concurrency,
+            "poster_cache_size": self._poster_cache_size,
+            "force_refresh": self._force_refresh,
+            "library_cache_ttl": self._library_cache_ttl,
+            "library_debounce": self._library_debounce,
+            "same_path": self._same_path
         })
 
     def get_state(self) -> bool:
@@ -319,6 +387,100 @@ class MediaCoverGenerator(_PluginBase):
                                        'prependInnerIcon': 'mdi-file-image', 'hint': '生成的封面在此另存一份',
                                        'persistentHint': True}}
                         ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 6},
+                        'content': [
+                            {'component': 'VSwitch',
+                             'props': {'model': 'fast_blur', 'label': '快速模糊',
+                                       'hint': '在缩小的图片上完成背景模糊，速度更快，与原尺寸模糊有细微差别',
+                                       'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 6},
+                        'content': [
+                            {'component': 'VSwitch',
+                             'props': {'model': 'force_refresh', 'label': '强制刷新',
+                                       'hint': '关闭时，图片、标题、字体和风格参数都未变化的媒体库跳过生成和上传',
+                                       'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 3},
+                        'content': [
+                            {'component': 'VSelect',
+                             'props': {'model': 'output_format', 'label': '封面格式',
+                                       'items': [{"title": "WebP", "value": "webp"},
+                                                 {"title": "JPEG", "value": "jpeg"}],
+                                       'hint': 'JPEG 编码快得多，WebP 可保留透明区域', 'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 3},
+                        'content': [
+                            {'component': 'VSelect',
+                             'props': {'model': 'encode_preset', 'label': '编码预设',
+                                       'items': [{"title": "速度优先", "value": "fast"},
+                                                 {"title": "均衡", "value": "balanced"},
+                                                 {"title": "体积优先", "value": "small"}],
+                                       'hint': '体积优先的 WebP 编码可能需要数秒', 'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 3},
+                        'content': [
+                            {'component': 'VTextField',
+                             'props': {'model': 'download_concurrency', 'label': '图片下载并发数',
+                                       'type': 'number', 'placeholder': str(DOWNLOAD_CONCURRENCY),
+                                       'hint': '每台媒体服务器同时下载的图片数量', 'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 3},
+                        'content': [
+                            {'component': 'VTextField',
+                             'props': {'model': 'poster_cache_size', 'label': '海报缓存上限（MB）',
+                                       'type': 'number', 'placeholder': str(POSTER_CACHE_SIZE),
+                                       'hint': '图片未变化时不再重复下载', 'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 3},
+                        'content': [
+                            {'component': 'VTextField',
+                             'props': {'model': 'library_cache_ttl', 'label': '媒体库列表缓存（分钟）',
+                                       'type': 'number', 'placeholder': str(LIBRARY_CACHE_TTL),
+                                       'hint': '入库监控与定时任务共用，0 为不缓存', 'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 3},
+                        'content': [
+                            {'component': 'VTextField',
+                             'props': {'model': 'library_debounce', 'label': '媒体库合并等待（秒）',
+                                       'type': 'number', 'placeholder': str(LIBRARY_DEBOUNCE),
+                                       'hint': '入库延迟后，同一媒体库再等待的时间，期间的入库合并更新，0 为不等待',
+                                       'persistentHint': True}}
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {'cols': 12, 'md': 6},
+                        'content': [
+                            {'component': 'VSwitch',
+                             'props': {'model': 'same_path', 'label': 'MoviePilot 与媒体服务器路径一致',
+                                       'hint': '开启后按入库路径直接查找媒体库，省去一次获取详情的请求；挂载路径不同时请勿开启',
+                                       'persistentHint': True}}
+                        ]
                     }
                 ]
             },
@@ -765,7 +927,16 @@ class MediaCoverGenerator(_PluginBase):
             "color_ratio": 0.8,
             "color_ratio_multi_1": 0.8,
             "single_use_primary": False,
-            "multi_1_use_primary": True
+            "multi_1_use_primary": True,
+            "fast_blur": False,
+            "output_format": "webp",
+            "encode_preset": "balanced",
+            "download_concurrency": DOWNLOAD_CONCURRENCY,
+            "poster_cache_size": POSTER_CACHE_SIZE,
+            "force_refresh": False,
+            "library_cache_ttl": LIBRARY_CACHE_TTL,
+            "library_debounce": LIBRARY_DEBOUNCE,
+            "same_path": False
         }
 
     def get_page(self) -> List[dict]:
@@ -777,33 +948,51 @@ class MediaCoverGenerator(_PluginBase):
             return
         if not self._transfer_monitor:
             return
-        self.__get_fonts()
         mediainfo: MediaInfo = event.event_data.get("mediainfo")
         if not mediainfo:
             return
-        if self._delay:
-            logger.info(f"延迟 {self._delay} 秒后开始更新封面")
-            time.sleep(int(self._delay))
+        # 只入队，延迟到期后由后台线程处理；同一媒体（如整季剧集）在到期前的多次入库合并为一次
+        try:
+            delay = int(self._delay or 0)
+        except (TypeError, ValueError):
+            delay = 0
+        media_key = (mediainfo.type, mediainfo.tmdb_id or mediainfo.douban_id or mediainfo.title_year)
+        target_path = self.__get_transfer_path(event.event_data.get("transferinfo"))
+        if self._transfer_queue and self._transfer_queue.submit(media_key, (mediainfo, target_path), delay=delay):
+            if delay:
+                logger.info(f"{mediainfo.title_year} 将在 {delay} 秒后开始更新封面")
+
+    @staticmethod
+    def __get_transfer_path(transferinfo):
+        """入库事件中整理后的文件路径，没有时返回 None"""
+        for attr in ("target_item", "target_diritem"):
+            path = getattr(getattr(transferinfo, attr, None), "path", None)
+            if path:
+                return path
+        return None
+
+    def __handle_transfer_group(self, media_key, entries):
+        """延迟到期后查找媒体所在媒体库，并入该媒体库的更新窗口"""
+        mediainfo, target_path = entries[-1]
         existsinfo = self.mschain.media_exists(mediainfo=mediainfo)
         if not existsinfo or not existsinfo.itemid:
             logger.warning(f"{mediainfo.title_year} 不存在媒体库中，可能服务器还未扫描完成，建议设置合适的延迟时间")
             return
-        iteminfo = self.mschain.iteminfo(server=existsinfo.server, item_id=existsinfo.itemid)
-        if not iteminfo:
-            logger.warning(f"获取 {mediainfo.title_year} 详情失败")
-            return
-        library_id = None
-        library = {}
+        library = None
         service = self._servers.get(existsinfo.server)
-        if service:
-            libraries = self.__get_server_libraries(service)
-        if libraries and not library_id:
-            library = next(
-                (library
-                 for library in libraries if library.get('Locations', [])
-                 and any(iteminfo.path.startswith(path) for path in library.get('Locations', []))),
-                None
-            )
+        if service and target_path and self._same_path:
+            # 两边路径一致时按入库事件中整理后的路径直接查找，省去一次获取详情的请求；
+            # 路径不同时前缀可能恰好匹配到其他媒体库，因此只在明确开启时使用
+            library = self.__get_library_index(service).find(target_path)
+        if service and not library:
+            iteminfo = self.mschain.iteminfo(server=existsinfo.server, item_id=existsinfo.itemid)
+            if not iteminfo:
+                logger.warning(f"获取 {mediainfo.title_year} 详情失败")
+                return
+            library = self.__get_library_index(service).find(iteminfo.path)
+            if not library:
+                # 缓存的媒体库列表中找不到，可能是新增或修改了媒体库，重新获取一次
+                library = self.__get_library_index(service, refresh=True).find(iteminfo.path)
         if not library:
             logger.warning(f"找不到 {mediainfo.title_year} 所在媒体库")
             return
@@ -814,37 +1003,77 @@ class MediaCoverGenerator(_PluginBase):
         if f"{existsinfo.server}-{library_id}" in self._exclude_libraries:
             logger.info(f"{existsinfo.server}：{library['Name']} 已忽略，跳过更新封面")
             return
-        old_history = self.get_data('cover_history') or []
-        latest_item = max(
-            (item for item in old_history if str(item.get("library_id")) == str(library_id)),
-            key=lambda x: x["timestamp"],
-            default=None
-        )
-        if latest_item and str(latest_item.get("item_id")) == str(existsinfo.itemid):
-            logger.info(f"媒体 {mediainfo.title_year} 在库中是最新记录，不更新封面图")
+        try:
+            library_debounce = float(self._library_debounce)
+        except (TypeError, ValueError):
+            library_debounce = LIBRARY_DEBOUNCE
+        if not self._library_queue.submit((existsinfo.server, str(library_id)),
+                                          (service, library, existsinfo.itemid, mediainfo),
+                                          delay=library_debounce):
+            logger.info(f"{mediainfo.title_year} 并入媒体库 {existsinfo.server}：{library['Name']} 待更新的封面")
+
+    def __handle_library_group(self, library_key, entries):
+        """同一媒体库在更新窗口内的所有入库只更新一次封面"""
+        server, library_id = library_key
+        library = entries[-1][1]
+        # 分组可能来自保存配置前的队列，按当前配置取媒体服务器并检查忽略列表
+        service = self._servers.get(server) if self._servers else None
+        fetcher = self._fetcher
+        if not service or not fetcher:
             return
-        new_history = self.update_cover_history(
-            server=existsinfo.server,
-            library_id=library_id,
-            item_id=existsinfo.itemid
-        )
+        if f"{server}-{library_id}" in (self._exclude_libraries or []):
+            return
+        latest_item = self._cover_history.latest(server, library_id)
+        new_items = []
+        for _, _, item_id, mediainfo in entries:
+            if latest_item and str(latest_item.get("item_id")) == str(item_id):
+                logger.info(f"媒体 {mediainfo.title_year} 在库中是最新记录，不更新封面图")
+                continue
+            new_items.append(item_id)
+        if not new_items:
+            return
+        # 与本次渲染使用的媒体项一起保存，封面无需更新时在最后保存
+        self.update_cover_history(server=server, library_id=library_id, item_ids=new_items, save=False)
+        self.__get_fonts()
         self._monitor_sort = 'DateCreated'
         # 支持 multi_2
-        if self._cover_style.startswith('single'):
-            if self.__update_library(service, library):
-                self._monitor_sort = ''
-                logger.info(f"媒体库 {existsinfo.server}：{library['Name']} 封面更新成功")
-        elif self._cover_style.startswith('multi'):
-            if self.__update_library(service, library):
+        try:
+            if self.__update_library(service, library, fetcher):
                 self._monitor_sort = ''
-                logger.info(f"媒体库 {existsinfo.server}：{library['Name']} 封面更新成功")
+                logger.info(f"媒体库 {server}：{library['Name']} 封面更新成功（合并 {len(entries)} 次入库）")
+        finally:
+            self.__save_cover_history()
 
     def __update_all_libraries(self):
         if not self._enabled:
             return
         if not self._servers:
             return
+        # 本次运行持有的停止信号与下载器，停止服务时替换为新的对象也不影响这里
+        fetcher, stop_event = self._fetcher, self._event
+        if not fetcher:
+            return
         self.__get_fonts()
+        # 下载、渲染、上传分阶段并行：渲染当前媒体库时，下一个媒体库的图片已在下载
+        pipeline = Pipeline(
+            stages=[
+                ("fetch", lambda task: self.__prepare_library(*task, fetcher)),
+                ("render", self.__render_library),
+                ("upload", self.__upload_library),
+            ],
+            stop_event=stop_event,
+            # 同名媒体库共用图片目录，渲染完成前不下载下一个同名媒体库的图片
+            key=lambda task: task[1]['Name'],
+            exclusive_until=1
+        )
+        pipeline.run(self.__iter_library_tasks(stop_event))
+        if stop_event.is_set():
+            logger.info("媒体库封面更新服务停止")
+            return
+        logger.info(f"所有媒体库封面更新完成，媒体库列表缓存{self._library_catalogue}")
+
+    def __iter_library_tasks(self, stop_event):
+        """依次生成所有需要更新封面的 (服务器, 媒体库)"""
         for server, service in self._servers.items():
             logger.info(f"当前服务器 {server}")
             cover_style = {
@@ -859,8 +1088,7 @@ class MediaCoverGenerator(_PluginBase):
                 logger.warning(f"服务器 {server} 的媒体库列表获取失败")
                 continue
             for library in libraries:
-                if self._event.is_set():
-                    logger.info("媒体库封面更新服务停止")
+                if stop_event.is_set():
                     return
                 if service.type == 'emby':
                     library_id = library.get("Id")
@@ -869,25 +1097,151 @@ class MediaCoverGenerator(_PluginBase):
                 if f"{server}-{library_id}" in self._exclude_libraries:
                     logger.info(f"媒体库 {server}：{library['Name']} 已忽略，跳过更新封面")
                     continue
-                if self.__update_library(service, library):
-                    logger.info(f"媒体库 {server}：{library['Name']} 封面更新成功")
-                else:
-                    logger.warning(f"媒体库 {server}：{library['Name']} 封面更新失败")
-        logger.info("所有媒体库封面更新完成")
+                yield service, library
 
-    def __update_library(self, service, library):
+    def __update_library(self, service, library, fetcher):
+        task = self.__prepare_library(service, library, fetcher)
+        if not task:
+            return False
+        task = self.__render_library(task)
+        if not task:
+            return False
+        if not self.__set_library_image(service, library, task["image"]):
+            return False
+        self.__save_library_fingerprint(task)
+        return True
+
+    def __prepare_library(self, service, library, fetcher):
+        """
+        准备生成封面所需的图片：自定义目录中的图片，或从媒体服务器下载的图片
+
+        返回:
+            渲染任务 dict，失败或封面无需更新时返回 None
+        """
         library_name = library['Name']
         logger.info(f"媒体库 {service.name}：{library_name} 开始准备更新封面")
         image_path = self.__check_custom_image(library_name)
         title = self.__get_library_title_from_yaml(library_name)
         if image_path:
             logger.info(f"媒体库 {service.name}：{library_name} 从自定义路径获取封面")
-            image_data = self.__generate_image_from_path(service.name, library_name, title, image_path[0])
+            sources = []
+            for path in image_path:
+                stat = os.stat(path)
+                sources.append((path, stat.st_size, stat.st_mtime_ns))
+            images = {"image_path": image_path[0], "item_ids": [], "sources": sources}
         else:
-            image_data = self.__generate_from_server(service, library, title)
+            images = self.__generate_from_server(service, library, fetcher)
+        if not images:
+            logger.warning(f"媒体库 {service.name}：{library_name} 封面更新失败")
+            return None
+        inputs = self.__get_style_inputs(library_name, images["image_path"])
+        fingerprint = self.__get_render_fingerprint(title, images["sources"], inputs)
+        if not self._force_refresh \
+                and self.__get_library_fingerprints().get(self.__get_library_key(service, library)) == fingerprint:
+            logger.info(f"媒体库 {service.name}：{library_name} 图片与封面设置均未变化，跳过更新封面")
+            return None
+        return {"service": service, "library": library, "title": title, "fingerprint": fingerprint, **images}
+
+    def __get_style_inputs(self, library_name, image_path):
+        """
+        风格渲染时实际读取的图片文件及其内容摘要
 
-        if image_data:
-            return self.__set_library_image(service, library, image_data)
+        单图风格只读取 image_path；多图风格读取媒体库图片目录中的所有图片（包括补齐 1-9.jpg 时复制的来源），
+        按文件名排序，下载的图片每次都会重新写入，因此按内容而不是修改时间计算
+        """
+        if self._cover_style.startswith('single'):
+            paths = [image_path] if image_path else []
+        else:
+            library_dir = os.path.join(self._covers_input if image_path else self._covers_path, library_name)
+            try:
+                names = sorted(name for name in os.listdir(library_dir)
+                               if name.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")))
+            except OSError:
+                names = []
+            paths = [os.path.join(library_dir, name) for name in names]
+        inputs = []
+        for path in paths:
+            digest = hashlib.sha1()
+            try:
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            except OSError:
+                continue
+            inputs.append((os.path.basename(path), digest.hexdigest()))
+        return inputs
+
+    def __get_render_fingerprint(self, title, sources, inputs):
+        """由风格、风格参数、字体文件内容、标题、有序的源图片和风格读取的图片文件计算封面指纹，相同指纹生成的封面相同"""
+        if self._cover_style.startswith('multi') and not self._multi_1_use_main_font:
+            font_paths = (self._zh_font_path_multi_1, self._en_font_path_multi_1)
+        else:
+            font_paths = (self._zh_font_path, self._en_font_path)
+        data = {
+            "style": self._cover_style,
+            "params": {
+                "zh_font_size": self._zh_font_size,
+                "en_font_size": self._en_font_size,
+                "zh_font_size_multi_1": self._zh_font_size_multi_1,
+                "en_font_size_multi_1": self._en_font_size_multi_1,
+                "blur_size": self._blur_size,
+                "blur_size_multi_1": self._blur_size_multi_1,
+                "color_ratio": self._color_ratio,
+                "color_ratio_multi_1": self._color_ratio_multi_1,
+                "multi_1_blur": self._multi_1_blur,
+                "fast_blur": self._fast_blur,
+                "output_format": self._output_format,
+                "encode_preset": self._encode_preset,
+            },
+            "fonts": [font_digest(path) for path in font_paths],
+            "title": title,
+            "sources": sources,
+            "inputs": inputs,
+        }
+        return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def __get_library_key(service, library):
+        if service.type == 'emby':
+            library_id = library.get("Id")
+        else:
+            library_id = library.get("ItemId")
+        return f"{service.name}-{library_id}"
+
+    def __get_library_fingerprints(self):
+        return self.get_data('cover_fingerprints') or {}
+
+    def __save_library_fingerprint(self, task):
+        """记录上传成功的封面指纹，读取、修改与保存在同一把锁内完成，并发保存时不会丢失记录"""
+        with self._fingerprint_lock:
+            fingerprints = self.__get_library_fingerprints()
+            fingerprints[self.__get_library_key(task["service"], task["library"])] = task["fingerprint"]
+            self.save_data('cover_fingerprints', fingerprints)
+
+    def __render_library(self, task):
+        """渲染封面并记录本次使用的媒体项，返回带有 image 的任务，失败时返回 None"""
+        service, library = task["service"], task["library"]
+        image_data = self.__generate_image_from_path(service.name, library['Name'], task["title"],
+                                                     task["image_path"])
+        if not image_data:
+            logger.warning(f"媒体库 {service.name}：{library['Name']} 封面更新失败")
+            return None
+        if service.type == 'emby':
+            library_id = library.get("Id")
+        else:
+            library_id = library.get("ItemId")
+        self.update_cover_history(server=service.name, library_id=library_id, item_ids=task["item_ids"])
+        return {**task, "image": image_data}
+
+    def __upload_library(self, task):
+        """上传封面到媒体服务器"""
+        service, library = task["service"], task["library"]
+        if self.__set_library_image(service, library, task["image"]):
+            self.__save_library_fingerprint(task)
+            logger.info(f"媒体库 {service.name}：{library['Name']} 封面更新成功")
+            return True
+        logger.warning(f"媒体库 {service.name}：{library['Name']} 封面更新失败")
+        return False
 
     def __check_custom_image(self, library_name):
         if not self._covers_input:
@@ -920,12 +1274,18 @@ class MediaCoverGenerator(_PluginBase):
             image_data = create_style_single_1(image_path, title, font_path,
                                                font_size=font_size,
                                                blur_size=blur_size,
-                                               color_ratio=color_ratio)
+                                               color_ratio=color_ratio,
+                                               fast_blur=self._fast_blur,
+                                               output_format=self._output_format,
+                                               encode_preset=self._encode_preset)
         elif self._cover_style == 'single_2':
             image_data = create_style_single_2(image_path, title, font_path,
                                                font_size=font_size,
                                                blur_size=blur_size,
-                                               color_ratio=color_ratio)
+                                               color_ratio=color_ratio,
+                                               fast_blur=self._fast_blur,
+                                               output_format=self._output_format,
+                                               encode_preset=self._encode_preset)
         elif self._cover_style == 'multi_1':
             zh_font_path = self._zh_font_path if self._multi_1_use_main_font else self._zh_font_path_multi_1
             en_font_path = self._en_font_path if self._multi_1_use_main_font else self._en_font_path_multi_1
@@ -940,7 +1300,10 @@ class MediaCoverGenerator(_PluginBase):
                                                   font_size=font_size,
                                                   is_blur=self._multi_1_blur,
                                                   blur_size=blur_size_multi_1,
-                                                  color_ratio=color_ratio_multi_1)
+                                                  color_ratio=color_ratio_multi_1,
+                                                  fast_blur=self._fast_blur,
+                                                  output_format=self._output_format,
+                                                  encode_preset=self._encode_preset)
         # 添加 Multi 2 的处理逻辑
         elif self._cover_style == 'multi_2':
             # 复用 multi_1 的字体设置，或者你可以创建新的配置项
@@ -957,17 +1320,24 @@ class MediaCoverGenerator(_PluginBase):
 
             # 准备图片逻辑与 multi_1 相同
             if self.prepare_library_images(library_dir):
-                image_data = create_style_multi_2(library_dir, title, font_path, font_size=font_size)
+                image_data = create_style_multi_2(library_dir, title, font_path, font_size=font_size,
+                                                  fast_blur=self._fast_blur,
+                                                  output_format=self._output_format,
+                                                  encode_preset=self._encode_preset)
+        font_stats = font_cache.stats()
+        logger.debug(f"字体缓存: 命中 {font_stats['hits']} 次，未命中 {font_stats['misses']} 次，已缓存 {font_stats['size']} 个")
 
         return image_data
 
-    def __generate_from_server(self, service, library, title):
+    def __generate_from_server(self, service, library, fetcher):
         logger.info(f"媒体库 {service.name}：{library['Name']} 开始筛选媒体项")
         required_items = 1 if self._cover_style.startswith('single') else 16
         items = []
         offset = 0
-        batch_size = 20
+        batch_size = page_size(required_items)
         max_attempts = 5
+        returned_items = 0
+        stats = QueryStats()
 
         library_type = library.get('CollectionType')
         if service.type == 'emby':
@@ -977,9 +1347,9 @@ class MediaCoverGenerator(_PluginBase):
         parent_id = library_id
 
         if library_type == "boxsets":
-            return self.__handle_boxset_library(service, library, title)
+            return self.__handle_boxset_library(service, library, fetcher, stats)
         elif library_type == "playlists":
-            return self.__handle_playlist_library(service, library, title)
+            return self.__handle_playlist_library(service, library, fetcher, stats)
         elif library_type == "music":
             include_types = 'MusicAlbum,Audio'
         else:
@@ -992,86 +1362,68 @@ class MediaCoverGenerator(_PluginBase):
         for attempt in range(max_attempts):
             batch_items = self.__get_items_batch(service, parent_id,
                                                  offset=offset, limit=batch_size,
-                                                 include_types=include_types)
+                                                 include_types=include_types, stats=stats)
             if not batch_items:
                 break
             valid_items = self.__filter_valid_items(batch_items)
             items.extend(valid_items)
-            if len(items) >= required_items:
+            returned_items += len(batch_items)
+            if len(items) >= required_items or len(batch_items) < batch_size:
                 break
-            offset += batch_size
+            offset += len(batch_items)
+            # 按目前的有效比例估算下一页需要多少媒体项
+            batch_size = page_size(required_items - len(items), len(items) / returned_items)
+        logger.info(f"媒体库 {service.name}：{library['Name']} 查询媒体项{stats}，有效 {len(items)}/{returned_items}")
 
         if len(items) > 0:
             if self._cover_style.startswith('single'):
-                return self.__update_single_image(service, library, title, items[0])
+                return self.__fetch_single_image(service, library, items[0], fetcher)
             else:
                 # multi 1 和 multi 2 都走这里，都是取前9张
-                return self.__update_grid_image(service, library, title, items[:16])
+                return self.__fetch_grid_image(service, library, items[:16], fetcher)
         else:
-            print(f"媒体库 {service.name}：{library['Name']} 无法找到有效的图片项目")
+            logger.warning(f"媒体库 {service.name}：{library['Name']} 无法找到有效的图片项目")
             return False
 
-    def __handle_boxset_library(self, service, library, title):
-        include_types = 'BoxSet,Movie'
-        if service.type == 'emby':
-            library_id = library.get("Id")
-        else:
-            library_id = library.get("ItemId")
-        parent_id = library_id
-        boxsets = self.__get_items_batch(service, parent_id, include_types=include_types)
-        required_items = 1 if self._cover_style.startswith('single') else 9
-        valid_items = []
-        valid_boxsets = self.__filter_valid_items(boxsets)
-        valid_items.extend(valid_boxsets)
-        if len(valid_items) < required_items:
-            for boxset in boxsets:
-                if len(valid_items) >= required_items:
-                    break
-                movies = self.__get_items_batch(service, parent_id=boxset['Id'], include_types=include_types)
-                valid_movies = self.__filter_valid_items(movies)
-                valid_items.extend(valid_movies)
-                if len(valid_items) >= required_items:
-                    break
-        if len(valid_items) > 0:
-            if self._cover_style.startswith('single'):
-                return self.__update_single_image(service, library, title, valid_items[0])
-            else:
-                return self.__update_grid_image(service, library, title, valid_items[:16])
-        else:
-            print(f"媒体库 {service.name}：{library['Name']} 无法找到有效的图片项目")
-            return False
+    def __handle_boxset_library(self, service, library, fetcher, stats=None):
+        return self.__handle_container_library(service, library, fetcher, 'BoxSet,Movie', 'BoxSet', stats)
 
-    def __handle_playlist_library(self, service, library, title):
-        include_types = 'Playlist,Movie,Series,Episode,Audio'
+    def __handle_playlist_library(self, service, library, fetcher, stats=None):
+        return self.__handle_container_library(service, library, fetcher, 'Playlist,Movie,Series,Episode,Audio',
+                                               'Playlist', stats)
+
+    def __handle_container_library(self, service, library, fetcher, include_types, container_type, stats=None):
+        """合集、播放列表媒体库：顶层媒体项不够时并发展开各合集或播放列表的子项"""
+        stats = stats or QueryStats()
         if service.type == 'emby':
             library_id = library.get("Id")
         else:
             library_id = library.get("ItemId")
         parent_id = library_id
-        playlists = self.__get_items_batch(service, parent_id, include_types=include_types)
+        containers = self.__get_items_batch(service, parent_id, include_types=include_types, stats=stats)
         required_items = 1 if self._cover_style.startswith('single') else 9
-        valid_items = []
-        valid_playlists = self.__filter_valid_items(playlists)
-        valid_items.extend(valid_playlists)
+        valid_items = self.__filter_valid_items(containers)
         if len(valid_items) < required_items:
-            for playlist in playlists:
-                if len(valid_items) >= required_items:
-                    break
-                movies = self.__get_items_batch(service, parent_id=playlist['Id'], include_types=include_types)
-                valid_movies = self.__filter_valid_items(movies)
-                valid_items.extend(valid_movies)
-                if len(valid_items) >= required_items:
-                    break
+            # 只有合集、播放列表本身才有子项，其余媒体项不必查询
+            parents = [item for item in containers if item.get('Type') == container_type]
+            valid_items.extend(expand_children(
+                parents,
+                lambda parent: self.__filter_valid_items(
+                    self.__get_items_batch(service, parent_id=parent['Id'], include_types=include_types,
+                                           stats=stats)),
+                required=required_items - len(valid_items)
+            ))
+        logger.info(f"媒体库 {service.name}：{library['Name']} 查询媒体项{stats}，有效 {len(valid_items)}")
         if len(valid_items) > 0:
             if self._cover_style.startswith('single'):
-                return self.__update_single_image(service, library, title, valid_items[0])
+                return self.__fetch_single_image(service, library, valid_items[0], fetcher)
             else:
-                return self.__update_grid_image(service, library, title, valid_items[:16])
+                return self.__fetch_grid_image(service, library, valid_items[:16], fetcher)
         else:
-            print(f"警告: 无法为播放列表 {service.name}：{library['Name']} 找到有效的图片项目")
+            logger.warning(f"媒体库 {service.name}：{library['Name']} 无法找到有效的图片项目")
             return False
 
-    def __get_items_batch(self, service, parent_id, offset=0, limit=20, include_types=None):
+    def __get_items_batch(self, service, parent_id, offset=0, limit=20, include_types=None, stats=None):
         try:
             if not service:
                 return []
@@ -1084,11 +1436,10 @@ class MediaCoverGenerator(_PluginBase):
                     sort_by = 'DateCreated'
                 if not include_types:
                     include_types = 'Movie,Series'
-                url = f'[HOST]emby/Items/?api_key=[APIKEY]' \
-                      f'&ParentId={parent_id}&SortBy={sort_by}&Limit={limit}' \
-                      f'&StartIndex={offset}&IncludeItemTypes={include_types}' \
-                      f'&Recursive=True&SortOrder=Descending'
+                url = items_query(parent_id, sort_by, include_types, offset, limit)
                 res = service.instance.get_data(url=url)
+                if stats is not None:
+                    stats.add(res)
                 if res:
                     data = res.json()
                     return data.get("Items", [])
@@ -1137,57 +1488,50 @@ class MediaCoverGenerator(_PluginBase):
                     seen_tags.update(tags)
         return valid_items
 
-    def __update_single_image(self, service, library, title, item):
+    def __fetch_single_image(self, service, library, item, fetcher):
         logger.info(f"媒体库 {service.name}：{library['Name']} 从媒体项获取图片")
-        updated_item_id = ''
         image_url = self.__get_image_url(item)
         if not image_url:
             return False
-        image_path = self.__download_image(service, image_url, library['Name'], count=1)
-        if not image_path:
+        image_content = fetcher.fetch(service, image_url, cache_key=self.__get_image_cache_key(service, item))
+        if not image_content:
             return False
-        updated_item_id = self.__get_item_id(item)
-        image_data = self.__generate_image_from_path(service.name, library['Name'], title, image_path)
-        if not image_data:
+        image_path = self.__save_library_image(library['Name'], 1, image_content)
+        if not image_path:
             return False
-        if service.type == 'emby':
-            library_id = library.get("Id")
-        else:
-            library_id = library.get("ItemId")
-        self.update_cover_history(
-            server=service.name,
-            library_id=library_id,
-            item_id=updated_item_id
-        )
-        return image_data
+        self.__prune_library_images(library['Name'], 1)
+        return {"image_path": image_path, "item_ids": [self.__get_item_id(item)],
+                "sources": [self.__get_image_ref(item)]}
 
-    def __update_grid_image(self, service, library, title, items):
+    def __fetch_grid_image(self, service, library, items, fetcher):
         logger.info(f"媒体库 {service.name}：{library['Name']} 从媒体项获取图片")
-        image_paths = []
-        updated_item_ids = []
-        for i, item in enumerate(items[:16]):
+        candidates = []
+        for item in items[:16]:
             image_url = self.__get_image_url(item)
             if image_url:
-                image_path = self.__download_image(service, image_url, library['Name'], count=i + 1)
-                if image_path:
-                    image_paths.append(image_path)
-                    updated_item_ids.append(self.__get_item_id(item))
-        if len(image_paths) < 1:
-            return False
-        image_data = self.__generate_image_from_path(service.name, library['Name'], title)
-        if not image_data:
+                candidates.append((image_url, item))
+        # 多图 1 只使用 9 张图片，下载够 9 张即可开始渲染
+        required = 9 if self._cover_style == 'multi_1' else len(candidates)
+        images = fetcher.fetch_many(service, [url for url, _ in candidates], required=required,
+                                    cache_keys=[self.__get_image_cache_key(service, item) for _, item in candidates])
+        updated_item_ids = []
+        sources = []
+        for count, (index, image_content) in enumerate(images, start=1):
+            if self.__save_library_image(library['Name'], count, image_content):
+                updated_item_ids.append(self.__get_item_id(candidates[index][1]))
+                sources.append(self.__get_image_ref(candidates[index][1]))
+        if len(updated_item_ids) < 1:
             return False
-        if service.type == 'emby':
-            library_id = library.get("Id")
-        else:
-            library_id = library.get("ItemId")
-        for item_id in updated_item_ids:
-            self.update_cover_history(
-                server=service.name,
-                library_id=library_id,
-                item_id=item_id
-            )
-        return image_data
+        self.__prune_library_images(library['Name'], len(images))
+        # 多图风格从媒体库图片目录读取，不指定单张图片
+        return {"image_path": None, "item_ids": updated_item_ids, "sources": sources}
+
+    def __get_image_cache_key(self, service, item):
+        """图片在海报缓存中的键，tag 变化即视为新图片"""
+        image_ref = self.__get_image_ref(item)
+        if not image_ref:
+            return None
+        return PosterCache.make_key(service.name, *image_ref)
 
     def __get_library_title_from_yaml(self, library_name):
         def preprocess_yaml_text(yaml_str: str) -> str:
@@ -1229,7 +1573,19 @@ class MediaCoverGenerator(_PluginBase):
                 logger.info(f"标题未正确配置，将使用库名: {library_name}")
         return (zh_title, en_title)
 
-    def __get_server_libraries(self, service):
+    def __get_server_libraries(self, service, refresh=False):
+        """获取媒体库列表，有效期内复用缓存，refresh 为 True 时重新获取"""
+        if not service:
+            return []
+        return self._library_catalogue.get(service.name, lambda: self.__fetch_server_libraries(service),
+                                           refresh=refresh)
+
+    def __get_library_index(self, service, refresh=False):
+        """获取媒体库目录的路径索引，媒体库列表重新获取后随之重建"""
+        return self._library_catalogue.get_index(service.name, lambda: self.__fetch_server_libraries(service),
+                                                 refresh=refresh)
+
+    def __fetch_server_libraries(self, service):
         try:
             if not service:
                 return []
@@ -1273,75 +1629,83 @@ class MediaCoverGenerator(_PluginBase):
             return []
 
     def __get_image_url(self, item):
+        image_ref = self.__get_image_ref(item)
+        if not image_ref:
+            return None
+        item_id, image_type, tag = image_ref
+        return f'[HOST]emby/Items/{item_id}/Images/{image_type}?tag={tag}&api_key=[APIKEY]'
+
+    def __get_image_ref(self, item):
+        """返回封面使用的图片 (媒体项 ID, 图片类型, tag)，没有可用图片时返回 None"""
         if item['Type'] in 'MusicAlbum,Audio':
             if item.get("ParentBackdropImageTags") and len(item["ParentBackdropImageTags"]) > 0:
                 item_id = item.get("ParentBackdropItemId")
                 tag = item["ParentBackdropImageTags"][0]
-                return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                return item_id, 'Backdrop/0', tag
             elif item.get("PrimaryImageTag"):
                 item_id = item.get("PrimaryImageItemId")
                 tag = item.get("PrimaryImageTag")
-                return f'[HOST]emby/Items/{item_id}/Images/Primary?tag={tag}&api_key=[APIKEY]'
+                return item_id, 'Primary', tag
             elif item.get("AlbumPrimaryImageTag"):
                 item_id = item.get("AlbumId")
                 tag = item.get("AlbumPrimaryImageTag")
-                return f'[HOST]emby/Items/{item_id}/Images/Primary?tag={tag}&api_key=[APIKEY]'
+                return item_id, 'Primary', tag
 
         elif self._cover_style.startswith('multi'):
             if self._multi_1_use_primary:
                 if item.get("ImageTags") and item.get("ImageTags").get("Primary"):
                     item_id = item.get("Id")
                     tag = item.get("ImageTags").get("Primary")
-                    return f'[HOST]emby/Items/{item_id}/Images/Primary?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Primary', tag
                 elif item.get("ParentBackdropImageTags") and len(item["ParentBackdropImageTags"]) > 0:
                     item_id = item.get("ParentBackdropItemId")
                     tag = item["ParentBackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
                 elif item.get("BackdropImageTags") and len(item["BackdropImageTags"]) > 0:
                     item_id = item.get("Id")
                     tag = item["BackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
             else:
                 if item.get("ParentBackdropImageTags") and len(item["ParentBackdropImageTags"]) > 0:
                     item_id = item.get("ParentBackdropItemId")
                     tag = item["ParentBackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
                 elif item.get("BackdropImageTags") and len(item["BackdropImageTags"]) > 0:
                     item_id = item.get("Id")
                     tag = item["BackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
                 elif item.get("ImageTags") and item.get("ImageTags").get("Primary"):
                     item_id = item.get("Id")
                     tag = item.get("ImageTags").get("Primary")
-                    return f'[HOST]emby/Items/{item_id}/Images/Primary?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Primary', tag
 
         elif self._cover_style.startswith('single'):
             if self._single_use_primary:
                 if item.get("ImageTags") and item.get("ImageTags").get("Primary"):
                     item_id = item.get("Id")
                     tag = item.get("ImageTags").get("Primary")
-                    return f'[HOST]emby/Items/{item_id}/Images/Primary?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Primary', tag
                 elif item.get("ParentBackdropImageTags") and len(item["ParentBackdropImageTags"]) > 0:
                     item_id = item.get("ParentBackdropItemId")
                     tag = item["ParentBackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
                 elif item.get("BackdropImageTags") and len(item["BackdropImageTags"]) > 0:
                     item_id = item.get("Id")
                     tag = item["BackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
             else:
                 if item.get("ParentBackdropImageTags") and len(item["ParentBackdropImageTags"]) > 0:
                     item_id = item.get("ParentBackdropItemId")
                     tag = item["ParentBackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
                 elif item.get("BackdropImageTags") and len(item["BackdropImageTags"]) > 0:
                     item_id = item.get("Id")
                     tag = item["BackdropImageTags"][0]
-                    return f'[HOST]emby/Items/{item_id}/Images/Backdrop/0?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Backdrop/0', tag
                 elif item.get("ImageTags") and item.get("ImageTags").get("Primary"):
                     item_id = item.get("Id")
                     tag = item.get("ImageTags").get("Primary")
-                    return f'[HOST]emby/Items/{item_id}/Images/Primary?tag={tag}&api_key=[APIKEY]'
+                    return item_id, 'Primary', tag
 
     def __get_item_id(self, item):
         if item['Type'] in 'MusicAlbum,Audio':
@@ -1379,40 +1743,34 @@ class MediaCoverGenerator(_PluginBase):
                     item_id = item.get("Id")
         return item_id
 
-    def __download_image(self, service, imageurl, library_name, count=None, retries=3, delay=1):
+    def __save_library_image(self, library_name, count, image_content):
+        """将下载的图片保存为媒体库图片目录中的 <count>.jpg"""
         try:
             subdir = os.path.join(self._covers_path, library_name)
             os.makedirs(subdir, exist_ok=True)
-            if count is not None:
-                filename = f"{count}.jpg"
-            else:
-                filename = f"img_{int(time.time())}.jpg"
-            filepath = os.path.join(subdir, filename)
-            for attempt in range(1, retries + 1):
-                image_content = None
-                if '[HOST]' in imageurl:
-                    if not service:
-                        return None
-                    r = service.instance.get_data(url=imageurl)
-                    if r and r.status_code == 200:
-                        image_content = r.content
-                else:
-                    r = RequestUtils().get_res(url=imageurl)
-                    if r and r.status_code == 200:
-                        image_content = r.content
-                if image_content:
-                    with open(filepath, 'wb') as f:
-                        f.write(image_content)
-                    return filepath
-                logger.warning(f"第 {attempt} 次尝试下载失败：{imageurl}")
-                if attempt < retries:
-                    time.sleep(delay)
-            logger.error(f"图片下载失败（重试 {retries} 次）：{imageurl}")
-            return None
+            filepath = os.path.join(subdir, f"{count}.jpg")
+            with open(filepath, 'wb') as f:
+                f.write(image_content)
+            return filepath
         except Exception as err:
-            logger.error(f"下载图片异常：{str(err)}")
+            logger.error(f"保存图片异常：{str(err)}")
             return None
 
+    def __prune_library_images(self, library_name, count):
+        """删除媒体库图片目录中编号大于 count 的图片，避免多图风格继续使用以前下载的海报"""
+        subdir = os.path.join(self._covers_path, library_name)
+        try:
+            names = os.listdir(subdir)
+        except OSError:
+            return
+        for name in names:
+            match = re.match(r"^(\d+)\.jpg$", name, re.IGNORECASE)
+            if match and int(match.group(1)) > count:
+                try:
+                    os.remove(os.path.join(subdir, name))
+                except OSError as err:
+                    logger.warning(f"删除过期图片 {name} 失败：{str(err)}")
+
     def __save_image_to_local(self, image_content, filename):
         try:
             local_path = self._covers_output
@@ -1425,7 +1783,7 @@ class MediaCoverGenerator(_PluginBase):
         except Exception as err:
             logger.error(f"保存图片到本地失败: {str(err)}")
 
-    def __set_library_image(self, service, library, image_base64):
+    def __set_library_image(self, service, library, image):
         try:
             if service.type == 'emby':
                 library_id = library.get("Id")
@@ -1433,15 +1791,12 @@ class MediaCoverGenerator(_PluginBase):
                 library_id = library.get("ItemId")
             url = f'[HOST]emby/Items/{library_id}/Images/Primary?api_key=[APIKEY]'
             if self._covers_output:
-                try:
-                    image_bytes = base64.b64decode(image_base64)
-                    self.__save_image_to_local(image_bytes, f"{library['Name']}.jpg")
-                except Exception as save_err:
-                    logger.error(f"保存发送前图片失败: {str(save_err)}")
+                self.__save_image_to_local(image.data, f"{library['Name']}{image.extension}")
+            # 媒体服务器的图片上传接口要求 base64 编码的请求体，只在这里编码一次
             res = service.instance.post_data(
                 url=url,
-                data=image_base64,
-                headers={"Content-Type": "image/png"}
+                data=image.to_base64(),
+                headers={"Content-Type": image.mime_type}
             )
             if res and res.status_code in [200, 204]:
                 return True
@@ -1470,40 +1825,15 @@ class MediaCoverGenerator(_PluginBase):
             self.save_data('cover_history', cleaned)
         return cleaned
 
-    def update_cover_history(self, server, library_id, item_id):
-        now = time.time()
-        item_id = str(item_id)
-        library_id = str(library_id)
-        history_item = {
-            "server": server,
-            "library_id": library_id,
-            "item_id": item_id,
-            "timestamp": now
-        }
-        history = self.get_data('cover_history') or []
-        grouped = defaultdict(list)
-        for item in history:
-            key = (item["server"], str(item["library_id"]))
-            grouped[key].append(item)
-        key = (server, library_id)
-        items = grouped[key]
-        existing = next((i for i in items if str(i["item_id"]) == item_id), None)
-        if existing:
-            if existing["timestamp"] >= max(i["timestamp"] for i in items):
-                return
-            else:
-                existing["timestamp"] = now
-        else:
-            items.append(history_item)
-        grouped[key] = sorted(items, key=lambda x: x["timestamp"], reverse=True)[:9]
-        new_history = []
-        for item_list in grouped.values():
-            new_history.extend(item_list)
-        self.save_data('cover_history', new_history)
-        return [
-            item for item in new_history
-            if str(item.get("library_id")) == str(library_id)
-        ]
+    def update_cover_history(self, server, library_id, item_ids, save=True):
+        """记录媒体库使用的媒体项，save 为 True 时有变化即保存，一次调用最多保存一次"""
+        self._cover_history.record(server, library_id, item_ids)
+        if save:
+            self.__save_cover_history()
+
+    def __save_cover_history(self):
+        if self._cover_history.dirty:
+            self.save_data('cover_history', self._cover_history.records())
 
     def prepare_library_images(self, library_dir: str):
         os.makedirs(library_dir, exist_ok=True)
@@ -1628,7 +1958,9 @@ class MediaCoverGenerator(_PluginBase):
             downloaded_font_file_path = Path(font_dir_path) / f"{download_base}{extension}"
             hash_file_path = Path(font_dir_path) / hash_filename
 
+            previous_font_path = getattr(self, final_attr, None)
             current_font_path = None
+            font_downloaded = False
             using_local_font = False
             if local_path_cfg:
                 local_font_p = Path(local_path_cfg)
@@ -1665,6 +1997,7 @@ class MediaCoverGenerator(_PluginBase):
                         except Exception as e:
                             logger.error(f"写入哈希文件失败 {hash_file_path}: {e}")
                         current_font_path = downloaded_font_file_path
+                        font_downloaded = True
                     else:
                         logger.critical(f"无法获取必要的{log_prefix}{lang}支持字体: {url}")
                         if font_file_is_valid:
@@ -1678,6 +2011,11 @@ class MediaCoverGenerator(_PluginBase):
                     current_font_path = downloaded_font_file_path
 
             setattr(self, final_attr, current_font_path)
+            # 字体文件变化后清除已加载的字体对象
+            if previous_font_path and (font_downloaded or str(previous_font_path) != str(current_font_path)):
+                font_cache.invalidate(previous_font_path)
+            if current_font_path and font_downloaded:
+                font_cache.invalidate(current_font_path)
             status_log = '(本地路径)' if using_local_font else '(已下载/缓存)' if current_font_path and current_font_path.exists() else '(获取失败)'
             logger.info(f"{log_prefix}{lang}字体最终路径: {getattr(self, final_attr)} {status_log}")
 
@@ -1787,12 +2125,23 @@ class MediaCoverGenerator(_PluginBase):
 
     def stop_service(self):
         try:
+            # 通知所有进行中的任务停止，包括 MoviePilot 调度的定时任务和入库队列中正在处理的任务
+            self._event.set()
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
                 if self._scheduler.running:
-                    self._event.set()
                     self._scheduler.shutdown()
-                    self._event.clear()
                 self._scheduler = None
+            if self._transfer_queue and self._library_queue:
+                self._pending_groups = (self._transfer_queue.stop(), self._library_queue.stop())
+            self._transfer_queue = None
+            self._library_queue = None
+            if self._fetcher:
+                # 进行中的任务持有下载器的引用，关闭后它们的下载直接返回空结果
+                self._fetcher.close()
+                self._fetcher = None
         except Exception as e:
             logger.error(f"停止服务失败: {str(e)}")
+        finally:
+            # 进行中的任务持有旧的停止信号，之后启动的任务使用新的
+            self._event = threading.Event()
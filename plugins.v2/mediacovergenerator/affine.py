@@ -0,0 +1,81 @@
+"""按旋转矩阵把贴片直接仿射绘制到输出画布，不再先拼到超大画布上整体旋转再裁剪"""
+import math
+
+from PIL import Image
+
+
+def rotation_affine(angle, center, origin=(0, 0)):
+    """
+    计算旋转的仿射系数 (a, b, c, d, e, f)：输出画布坐标 (x, y) 对应的原坐标为
+    (a * x + b * y + c, d * x + e * y + f)
+
+    与 Image.rotate(angle, center=center) 之后从 origin 处裁剪得到的画布逐像素等价
+
+    参数:
+        angle: 旋转角度（逆时针为正，与 Image.rotate 一致）
+        center: 旋转中心（原坐标）
+        origin: 输出画布左上角在旋转后坐标系中的位置
+    """
+    rad = -math.radians(angle)
+    a, b = round(math.cos(rad), 15), round(math.sin(rad), 15)
+    d, e = -b, a
+    cx, cy = center
+    ox, oy = origin
+    c = a * (ox - cx) + b * (oy - cy) + cx
+    f = d * (ox - cx) + e * (oy - cy) + cy
+    return a, b, c, d, e, f
+
+
+def rotated_size(size, angle):
+    """返回 Image.rotate(angle, expand=True) 得到的画布尺寸"""
+    w, h = size
+    a, b, c, d, e, f = rotation_affine(angle, (w / 2, h / 2))
+    xs = [a * x + b * y + c for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    ys = [d * x + e * y + f for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    return math.ceil(max(xs)) - math.floor(min(xs)), math.ceil(max(ys)) - math.floor(min(ys))
+
+
+def affine_box(affine, position, size, canvas_size, padding=2):
+    """
+    计算位于原坐标 position、尺寸为 size 的贴片在输出画布上覆盖的区域
+
+    返回:
+        (left, top, right, bottom)，已裁剪到画布范围内；贴片完全在画布外时返回 None
+    """
+    a, b, c, d, e, f = affine
+    det = a * e - b * d
+    x0, y0 = position
+    w, h = size
+    xs, ys = [], []
+    for sx, sy in ((x0, y0), (x0 + w, y0), (x0, y0 + h), (x0 + w, y0 + h)):
+        px, py = sx - c, sy - f
+        xs.append((e * px - b * py) / det)
+        ys.append((a * py - d * px) / det)
+    left = max(0, math.floor(min(xs)) - padding)
+    top = max(0, math.floor(min(ys)) - padding)
+    right = min(canvas_size[0], math.ceil(max(xs)) + padding)
+    bottom = min(canvas_size[1], math.ceil(max(ys)) + padding)
+    if left >= right or top >= bottom:
+        return None
+    return left, top, right, bottom
+
+
+def paste_affine(canvas, tile, position, affine, box=None, resample=Image.BICUBIC):
+    """
+    将位于原坐标 position 的 RGBA 贴片按仿射变换绘制到画布上，只变换贴片实际覆盖的区域
+
+    返回:
+        是否有内容绘制到画布上
+    """
+    if box is None:
+        box = affine_box(affine, position, tile.size, canvas.size)
+    if box is None:
+        return False
+    a, b, c, d, e, f = affine
+    left, top, right, bottom = box
+    x0, y0 = position
+    data = (a, b, a * left + b * top + c - x0,
+            d, e, d * left + e * top + f - y0)
+    piece = tile.transform((right - left, bottom - top), Image.AFFINE, data, resample=resample)
+    canvas.paste(piece, (left, top), piece)
+    return True
@@ -0,0 +1,88 @@
+"""
+各媒体服务器 Library/VirtualFolders 结果的缓存，以及由它构建的路径索引
+
+入库监控和定时任务共用同一份列表，批量入库时不再重复请求。
+"""
+import threading
+import time
+
+from app.plugins.mediacovergenerator.libraryindex import LibraryIndex
+
+
+# 默认有效期（分钟）
+LIBRARY_CACHE_TTL = 10
+
+# 强制刷新的最小间隔（秒），避免批量入库时每个找不到媒体库的事件都重新请求
+REFRESH_MIN_INTERVAL = 60
+
+
+class LibraryCatalogue:
+    """
+    按服务器名称缓存媒体库列表，线程安全
+
+    同一服务器同时只加载一次，并发的调用方等待并复用这次加载的结果；空列表视为加载失败，不缓存
+    """
+
+    def __init__(self, ttl=LIBRARY_CACHE_TTL * 60):
+        """
+        参数:
+            ttl: 有效期（秒），为 0 时不缓存
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._libraries = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, server, loader, refresh=False):
+        """
+        获取服务器的媒体库列表
+
+        参数:
+            server: 服务器名称
+            loader: 缓存失效时调用的加载函数，返回媒体库列表
+            refresh: 为 True 时忽略缓存重新加载，距上次加载不足 REFRESH_MIN_INTERVAL 秒时仍使用缓存
+        """
+        with self._lock:
+            server_lock = self._loading.setdefault(server, threading.Lock())
+        requested = time.monotonic()
+        with server_lock:
+            with self._lock:
+                cached = self._libraries.get(server)
+                age = time.monotonic() - cached[0] if cached else None
+                max_age = min(self.ttl, REFRESH_MIN_INTERVAL) if refresh else self.ttl
+                # 等待期间其他调用方已经完成的加载同样可用
+                if cached and (cached[0] >= requested or age < max_age):
+                    self.hits += 1
+                    return cached[1]
+                self.misses += 1
+            libraries = loader() or []
+            if libraries:
+                with self._lock:
+                    self._libraries[server] = (time.monotonic(), libraries)
+            return libraries
+
+    def get_index(self, server, loader, refresh=False):
+        """获取服务器媒体库目录的路径索引，参数与 get 相同，媒体库列表重新加载后重建"""
+        libraries = self.get(server, loader, refresh=refresh)
+        with self._lock:
+            cached = self._indexes.get(server)
+            if cached is None or cached[0] is not libraries:
+                cached = self._indexes[server] = (libraries, LibraryIndex(libraries))
+            return cached[1]
+
+    def invalidate(self, server=None):
+        """清除指定服务器的缓存，server 为 None 时清空全部，插件配置保存后调用"""
+        with self._lock:
+            if server is None:
+                self._libraries.clear()
+                self._indexes.clear()
+            else:
+                self._libraries.pop(server, None)
+                self._indexes.pop(server, None)
+
+    def __str__(self):
+        with self._lock:
+            return f"命中 {self.hits} 次，未命中 {self.misses} 次"
@@ -0,0 +1,92 @@
+"""
+封面历史的内存索引
+
+按 (服务器, 媒体库) 分组，每组只保留最近用过的若干媒体项；一次封面更新的多条记录合并为一次持久化。
+"""
+import threading
+import time
+from collections import deque
+
+# 每个媒体库保留的历史记录数量
+HISTORY_SIZE = 9
+
+
+class CoverHistory:
+    """
+    内存中的封面历史，线程安全
+
+    每个媒体库一个定长的环形缓冲区，按记录时间从旧到新排列，最后一条即最新记录
+    """
+
+    def __init__(self, records=None, size=HISTORY_SIZE):
+        """
+        参数:
+            records: 持久化的历史记录列表，每条包含 server、library_id、item_id、timestamp
+            size: 每个媒体库保留的记录数量
+        """
+        self.size = size
+        self.dirty = False
+        self._groups = {}
+        self._lock = threading.Lock()
+        for record in sorted(records or [], key=lambda x: x["timestamp"]):
+            group = self._group((record["server"], str(record["library_id"])))
+            self._remove(group, str(record["item_id"]))
+            group.append(dict(record, library_id=str(record["library_id"]), item_id=str(record["item_id"])))
+
+    def _group(self, key):
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = deque(maxlen=self.size)
+        return group
+
+    @staticmethod
+    def _remove(group, item_id):
+        for record in group:
+            if record["item_id"] == item_id:
+                group.remove(record)
+                return
+
+    def latest(self, server, library_id):
+        """媒体库最新的一条记录，没有时返回 None"""
+        with self._lock:
+            group = self._groups.get((server, str(library_id)))
+            return dict(group[-1]) if group else None
+
+    def record(self, server, library_id, item_ids):
+        """
+        按顺序记录媒体项，已是最新记录的媒体项不重复记录，其余已有记录的媒体项更新为最新
+
+        返回:
+            是否有记录发生变化
+        """
+        key = (server, str(library_id))
+        changed = False
+        with self._lock:
+            group = self._group(key)
+            for item_id in item_ids:
+                item_id = str(item_id)
+                if group and group[-1]["item_id"] == item_id:
+                    continue
+                # 同一批记录的时间戳保持递增，重新加载后顺序不变
+                now = max(time.time(), group[-1]["timestamp"] + 1e-6) if group else time.time()
+                self._remove(group, item_id)
+                group.append({
+                    "server": server,
+                    "library_id": key[1],
+                    "item_id": item_id,
+                    "timestamp": now
+                })
+                changed = True
+            if changed:
+                self.dirty = True
+        return changed
+
+    def records(self):
+        """
+        全部记录，用于持久化，同一媒体库的记录从新到旧排列
+
+        取出后清除待保存标记
+        """
+        with self._lock:
+            self.dirty = False
+            return [dict(record) for group in self._groups.values() for record in reversed(group)]
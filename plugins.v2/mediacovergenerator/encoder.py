@@ -0,0 +1,123 @@
+"""
+各风格共用的封面编码
+
+不透明的 RGBA 画布先压平为 RGB，再按预设编码为 WebP 或 JPEG，日志记录耗时与体积。
+"""
+import base64
+import io
+import time
+
+from PIL import features
+
+from app.log import logger
+
+
+# 默认输出格式与预设
+DEFAULT_FORMAT = "webp"
+DEFAULT_PRESET = "balanced"
+DEFAULT_QUALITY = 85
+
+# 各格式在速度与体积之间取舍的编码参数：fast 编码最快，small 体积最小，balanced 居中
+ENCODE_PRESETS = {
+    "webp": {
+        "fast": {"method": 2},
+        "balanced": {"method": 4},
+        "small": {"method": 6},
+    },
+    "jpeg": {
+        "fast": {"optimize": False, "progressive": False},
+        "balanced": {"optimize": True, "progressive": False},
+        "small": {"optimize": True, "progressive": True},
+    },
+}
+
+MIME_TYPES = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+
+EXTENSIONS = {
+    "webp": ".webp",
+    "jpeg": ".jpg",
+    "png": ".png",
+}
+
+
+class EncodedImage:
+    """
+    编码后的封面：图片字节、格式与编码耗时
+
+    渲染结果以字节形式直接交给本地保存和上传，只在调用媒体服务器接口时才转为 base64
+    """
+
+    def __init__(self, data, format, encode_time=0.0):
+        self.data = data
+        self.format = format
+        self.encode_time = encode_time
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.format]
+
+    @property
+    def extension(self):
+        return EXTENSIONS[self.format]
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def to_base64(self):
+        return base64.b64encode(self.data).decode('utf-8')
+
+
+def flatten_opaque(image):
+    """
+    将完全不透明的图片压平为 RGB，带有透明像素的图片保持 RGBA
+
+    风格的画布多为 RGBA，但合成后 alpha 全为 255，压平后可以使用不支持透明的格式且编码更快
+    """
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA", "PA") or image.info.get('transparency') is not None:
+        rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+        if rgba.getchannel("A").getextrema()[0] < 255:
+            return rgba
+        return rgba.convert("RGB")
+    return image.convert("RGB")
+
+
+def encode_image(image, format=DEFAULT_FORMAT, preset=DEFAULT_PRESET, quality=DEFAULT_QUALITY):
+    """
+    将渲染好的封面编码为图片字节
+
+    参数:
+        image: PIL.Image 对象
+        format: "webp" 或 "jpeg"，当前环境不支持 WebP 时改用 JPEG
+        preset: "fast"、"balanced" 或 "small"，见 ENCODE_PRESETS
+        quality: 有损压缩质量
+
+    返回:
+        EncodedImage 对象
+    """
+    format = (format or DEFAULT_FORMAT).lower()
+    if format not in ENCODE_PRESETS:
+        raise ValueError(f"Unsupported format: {format}")
+    if format == "webp" and not features.check("webp"):
+        format = "jpeg"
+    options = ENCODE_PRESETS[format].get(preset) or ENCODE_PRESETS[format][DEFAULT_PRESET]
+
+    start = time.perf_counter()
+    image = flatten_opaque(image)
+    # JPEG 不支持透明，带透明像素的画布直接丢弃 alpha
+    if format == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=format.upper(), quality=quality, **options)
+    encoded = EncodedImage(buffer.getvalue(), format, time.perf_counter() - start)
+
+    logger.info(f"封面编码: {format.upper()}（{preset}）{image.width}x{image.height}，"
+                f"{encoded.size / 1024:.1f} KB，耗时 {encoded.encode_time * 1000:.0f} ms")
+    return encoded
+
@@ -0,0 +1,200 @@
+"""
+并发下载海报
+
+每台媒体服务器一个线程池和 keep-alive 会话，凑够所需数量即返回；
+单张图片的超时与重试不阻塞其他图片，配置了海报缓存时优先读取缓存。
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.log import logger
+from app.utils.http import RequestUtils
+from app.utils.url import UrlUtils
+
+
+# 每台服务器同时下载的图片数量
+DOWNLOAD_CONCURRENCY = 4
+
+# 单次请求超时（秒）
+DOWNLOAD_TIMEOUT = 20
+
+
+class ImageFetcher:
+    """
+    按服务器复用会话与线程池的图片下载器，线程安全
+
+    close 之后不再发起新的下载，持有该下载器的任务拿到的结果为空并尽快结束
+    """
+
+    def __init__(self, concurrency=DOWNLOAD_CONCURRENCY, timeout=DOWNLOAD_TIMEOUT, retries=3, delay=1, cache=None):
+        try:
+            self.concurrency = max(1, int(concurrency))
+        except (TypeError, ValueError):
+            self.concurrency = DOWNLOAD_CONCURRENCY
+        self.timeout = timeout
+        self.retries = retries
+        self.delay = delay
+        self.cache = cache
+        self._servers = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._warned = set()
+
+    def _stopped(self, stop_event=None):
+        return self._closed.is_set() or (stop_event is not None and stop_event.is_set())
+
+    def _server(self, service):
+        """获取服务器对应的 (会话, 线程池)，不存在时创建，下载器已关闭时返回 None"""
+        with self._lock:
+            if self._closed.is_set():
+                return None
+            server = self._servers.get(service.name)
+            if server is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                              thread_name_prefix=f"fetch-{service.name}")
+                server = self._servers[service.name] = (session, executor)
+            return server
+
+    def _resolve_url(self, service, url):
+        """
+        用媒体服务器配置中的地址与 API Key 替换 [HOST] 与 [APIKEY]，与媒体服务器实例的 get_data 一致
+
+        配置不完整时返回 None，由调用方退回媒体服务器实例自己的 get_data
+        """
+        if '[HOST]' not in url:
+            return url
+        conf = getattr(getattr(service, "config", None), "config", None) or {}
+        host, apikey = conf.get("host"), conf.get("apikey")
+        if not host or not apikey:
+            if service.name not in self._warned:
+                self._warned.add(service.name)
+                logger.warning(f"媒体服务器 {service.name} 的配置中没有地址或 API Key，改用媒体服务器实例的请求方法下载图片，不复用连接")
+            return None
+        return url.replace("[HOST]", UrlUtils.standardize_base_url(host)).replace("[APIKEY]", apikey)
+
+    def fetch(self, service, url, stop_event=None, cache_key=None):
+        """
+        下载单张图片，失败时按 delay 间隔重试
+
+        参数:
+            cache_key: PosterCache.make_key 生成的缓存键，为 None 时不使用缓存
+
+        返回:
+            图片内容 bytes，失败返回 None
+        """
+        if self._stopped(stop_event):
+            return None
+        if self.cache and cache_key:
+            content = self.cache.get(cache_key)
+            if content:
+                return content
+        content = self._download(service, url, stop_event)
+        if content and self.cache and cache_key:
+            self.cache.put(cache_key, content)
+        return content
+
+    def _download(self, service, url, stop_event=None):
+        server = self._server(service)
+        if server is None:
+            return None
+        session, _ = server
+        resolved = self._resolve_url(service, url)
+        for attempt in range(1, self.retries + 1):
+            if self._stopped(stop_event):
+                return None
+            try:
+                if resolved:
+                    r = RequestUtils(session=session, timeout=self.timeout).get_res(url=resolved)
+                else:
+                    # 取不到服务器地址时退回媒体服务器实例自己的请求方法
+                    r = service.instance.get_data(url=url)
+                if r and r.status_code == 200 and r.content:
+                    return r.content
+            except Exception as err:
+                logger.debug(f"下载图片异常：{str(err)}")
+            logger.warning(f"第 {attempt} 次尝试下载失败：{url}")
+            if attempt < self.retries:
+                time.sleep(self.delay)
+        logger.error(f"图片下载失败（重试 {self.retries} 次）：{url}")
+        return None
+
+    def fetch_many(self, service, urls, required=None, stop_event=None, cache_keys=None):
+        """
+        并发下载多张图片
+
+        参数:
+            service: 媒体服务器
+            urls: 图片地址列表，排在前面的优先
+            required: 需要的图片数量，为 None 时下载全部
+            stop_event: 停止信号
+            cache_keys: 与 urls 一一对应的缓存键
+
+        返回:
+            [(序号, 图片内容), ...]，按序号排列；凑够 required 张时，
+            只要排在它们前面的图片都已结束就立即返回，其余尚未开始的下载被取消
+        """
+        if not urls:
+            return []
+        required = len(urls) if required is None else min(required, len(urls))
+        server = self._server(service)
+        if server is None:
+            return []
+        _, executor = server
+        cache_keys = cache_keys or [None] * len(urls)
+        try:
+            futures = {executor.submit(self.fetch, service, url, stop_event, cache_keys[index]): index
+                       for index, url in enumerate(urls)}
+        except RuntimeError:
+            # 提交期间下载器被关闭
+            return []
+        results = [None] * len(urls)
+        done_flags = [False] * len(urls)
+        pending = set(futures)
+        start = time.perf_counter()
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    done_flags[index] = True
+                    results[index] = None if future.cancelled() else future.result()
+                if self._stopped(stop_event):
+                    break
+                # 按顺序检查：前面的图片都已结束且成功数量足够时即可返回
+                succeeded = 0
+                for index in range(len(urls)):
+                    if not done_flags[index]:
+                        break
+                    if results[index]:
+                        succeeded += 1
+                if succeeded >= required:
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+
+        images = [(index, content) for index, content in enumerate(results) if content][:required]
+        logger.info(f"媒体服务器 {service.name}：获取 {len(images)}/{len(urls)} 张图片，"
+                    f"耗时 {time.perf_counter() - start:.1f} 秒")
+        if self.cache:
+            stats = self.cache.stats()
+            logger.debug(f"海报缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次，"
+                         f"已缓存 {stats['count']} 张 {stats['bytes'] / 1024 / 1024:.1f} MB")
+        return images
+
+    def close(self):
+        """关闭所有会话和线程池，之后的下载请求直接返回空结果"""
+        with self._lock:
+            self._closed.set()
+            servers, self._servers = self._servers, {}
+        for session, executor in servers.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+            session.close()
@@ -0,0 +1,89 @@
+"""
+字体对象与字体文件摘要的缓存
+
+ImageFont.truetype 解析字体文件（尤其是体积较大的中文字体）开销较大，同一字体文件和字号在整个进程中只加载一次。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from PIL import ImageFont
+
+
+# 最多缓存的字体对象数量（路径与字号的组合）
+FONT_CACHE_SIZE = 16
+
+
+class FontCache:
+    """
+    按 (真实路径, 字号, 文件摘要) 缓存 FreeTypeFont 对象的进程级 LRU 缓存，线程安全
+
+    渲染线程每次运行都会重新创建，缓存放在进程级的字典中，跨运行复用；
+    字体对象加载后只被读取（字号在加载时确定），Pillow 调用 FreeType 时持有 GIL，多个线程可以共用。
+    文件被替换后摘要改变，会重新加载
+    """
+
+    def __init__(self, maxsize=FONT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, font_path, size):
+        """获取字体对象，参数与 ImageFont.truetype(font_path, size) 相同"""
+        path = os.path.realpath(str(font_path))
+        key = (path, size, font_digest(path))
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            font = ImageFont.truetype(path, size)
+            self._fonts[key] = font
+            while len(self._fonts) > self.maxsize:
+                self._fonts.popitem(last=False)
+            self.misses += 1
+            return font
+
+    def invalidate(self, font_path=None):
+        """字体文件变化后调用，移除该文件已加载的字体对象，不指定文件时全部移除"""
+        path = os.path.realpath(str(font_path)) if font_path else None
+        with self._lock:
+            for key in [key for key in self._fonts if path is None or key[0] == path]:
+                del self._fonts[key]
+
+    def stats(self):
+        """返回命中次数、未命中次数与缓存数量"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._fonts)}
+
+
+font_cache = FontCache()
+
+
+def get_font(font_path, size):
+    """从进程级字体缓存中获取字体对象"""
+    return font_cache.get(font_path, size)
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _file_digest(path, size, mtime_ns):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def font_digest(font_path):
+    """字体文件内容的 SHA-1，按文件大小与修改时间缓存，文件不存在时返回 None"""
+    try:
+        path = os.path.realpath(str(font_path))
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return _file_digest(path, stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,75 @@
+"""线性、幂曲线与斜线分割遮罩，渐变由一次 NumPy 数组运算生成"""
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def _broadcast_row(row, height):
+    """将一行遮罩数据沿垂直方向展开为 L 模式图像"""
+    data = np.ascontiguousarray(np.broadcast_to(row, (height, row.shape[0])))
+    return Image.fromarray(data, "L")
+
+
+def linear_gradient_row(width, max_value=255):
+    """返回一行从左到右的线性渐变值 (uint8)，第 x 列为 int(x / width * max_value)"""
+    return (np.arange(width, dtype=np.float64) / width * int(max_value)).astype(np.uint8)
+
+
+def linear_gradient_mask(width, height, max_value=255):
+    """
+    创建从左到右的线性渐变遮罩
+
+    参数:
+        width: 遮罩宽度
+        height: 遮罩高度
+        max_value: 最右侧的遮罩值 (0-255)
+
+    返回:
+        L 模式遮罩，第 x 列的值为 int(x / width * max_value)
+    """
+    return _broadcast_row(linear_gradient_row(width, max_value), height)
+
+
+def power_gradient_mask(width, height, exponent=0.7, max_value=255):
+    """
+    创建从左到右的幂曲线渐变遮罩，exponent 小于 1 时左侧深色区域更大
+
+    参数:
+        width: 遮罩宽度
+        height: 遮罩高度
+        exponent: 幂指数
+        max_value: 最右侧的遮罩值 (0-255)
+
+    返回:
+        L 模式遮罩，第 x 列的值为 int(max_value * (x / width) ** exponent)
+    """
+    row = (float(max_value) * (np.arange(width, dtype=np.float64) / width) ** exponent).astype(np.uint8)
+    return _broadcast_row(row, height)
+
+
+def diagonal_gradient_mask(width, height, top_x, bottom_x, feather=0, inside=255, outside=0):
+    """
+    创建斜线分割遮罩：分割线从顶部 top_x 连到底部 bottom_x，线左侧为 inside，右侧为 outside
+
+    参数:
+        width: 遮罩宽度
+        height: 遮罩高度
+        top_x: 分割线在顶部的 x 坐标
+        bottom_x: 分割线在底部的 x 坐标
+        feather: 分割线两侧的过渡宽度（像素），0 为硬边
+        inside: 分割线左侧的遮罩值
+        outside: 分割线右侧的遮罩值
+
+    返回:
+        L 模式遮罩
+    """
+    if feather <= 0:
+        # 硬边直接由 PIL 光栅化多边形，比 NumPy 逐像素比较快
+        mask = Image.new("L", (width, height), inside)
+        ImageDraw.Draw(mask).polygon([(top_x, 0), (width, 0), (width, height), (bottom_x, height)], fill=outside)
+        return mask
+    ys = np.arange(height, dtype=np.float32)[:, None]
+    xs = np.arange(width, dtype=np.float32)[None, :]
+    boundary = top_x + (bottom_x - top_x) * ys / height
+    weight = np.clip((boundary - xs) / feather + 0.5, 0.0, 1.0)
+    data = outside + (inside - outside) * weight
+    return Image.fromarray(np.rint(data).astype(np.uint8), "L")
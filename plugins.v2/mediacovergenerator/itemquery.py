@@ -0,0 +1,114 @@
+"""
+媒体项查询的地址拼接、分页估算、子项并发展开与流量统计
+
+只请求筛选和拼接图片地址用到的字段，并关闭用户数据。
+"""
+import math
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# 筛选媒体项和拼接图片地址时读取的键，tests/test_itemquery.py 检查插件只读取这些键
+ITEM_KEYS = ("Id", "Type", "ImageTags", "BackdropImageTags", "ParentBackdropImageTags", "ParentBackdropItemId",
+             "PrimaryImageTag", "PrimaryImageItemId", "AlbumId", "AlbumPrimaryImageTag")
+
+# 原来的查询不带 Fields 参数，这里显式只请求一个开销很小的可选字段。
+# ITEM_KEYS 都不在 Jellyfin 的 ItemFields 可选字段中，图片 tag 由 EnableImageTypes 控制；
+# 尚未对照 Emby 的实际响应逐项核对，出现缺失时去掉 Fields 参数即可恢复原来的行为
+ITEM_FIELDS = "PrimaryImageAspectRatio"
+ITEM_IMAGE_TYPES = "Primary,Backdrop"
+
+# 分页大小范围
+PAGE_SIZE_MIN = 10
+PAGE_SIZE_MAX = 200
+
+# 按有效比例估算分页大小时预留的余量
+PAGE_SIZE_HEADROOM = 1.25
+
+# 尚无观测数据时假设的有效比例下限，避免比例过低时一次请求过多
+VALID_RATIO_MIN = 0.1
+
+# 同时查询子项的合集、播放列表数量
+EXPAND_CONCURRENCY = 4
+
+
+def items_query(parent_id, sort_by, include_types, offset, limit, recursive=True):
+    """拼接 emby/Items 查询地址，[HOST] 与 [APIKEY] 由媒体服务器实例替换"""
+    return f'[HOST]emby/Items/?api_key=[APIKEY]' \
+           f'&ParentId={parent_id}&SortBy={sort_by}&Limit={limit}' \
+           f'&StartIndex={offset}&IncludeItemTypes={include_types}' \
+           f'&Recursive={recursive}&SortOrder=Descending' \
+           f'&Fields={ITEM_FIELDS}&EnableImageTypes={ITEM_IMAGE_TYPES}&ImageTypeLimit=1' \
+           f'&EnableUserData=false&EnableTotalRecordCount=false'
+
+
+def page_size(remaining, valid_ratio=1.0):
+    """
+    估算还需要 remaining 个有效媒体项时下一页的大小
+
+    参数:
+        remaining: 还缺少的有效媒体项数量
+        valid_ratio: 已返回媒体项中有效项的比例
+    """
+    ratio = max(VALID_RATIO_MIN, min(1.0, valid_ratio))
+    size = math.ceil(max(1, remaining) / ratio * PAGE_SIZE_HEADROOM)
+    return max(PAGE_SIZE_MIN, min(PAGE_SIZE_MAX, size))
+
+
+def expand_children(parents, fetch_children, required, concurrency=EXPAND_CONCURRENCY):
+    """
+    并发查询多个父项（合集、播放列表）的子项，结果按父项顺序合并
+
+    参数:
+        parents: 父项列表，排在前面的优先
+        fetch_children: 查询一个父项的有效子项列表的函数
+        required: 需要的子项数量，按父项顺序累计达到该数量即返回，其余尚未开始的查询被取消
+
+    返回:
+        按父项顺序排列的子项列表
+    """
+    if not parents or required <= 0:
+        return []
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="expand")
+    futures = {executor.submit(fetch_children, parent): index for index, parent in enumerate(parents)}
+    results = [None] * len(parents)
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = [] if future.cancelled() or future.exception() else future.result()
+            # 排在前面的父项都已完成且子项数量足够时即可返回
+            found = 0
+            for children in results:
+                if children is None:
+                    break
+                found += len(children)
+            if found >= required:
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    items = []
+    for children in results:
+        if children is None:
+            break
+        items.extend(children)
+    return items
+
+
+class QueryStats:
+    """一个媒体库查询媒体项的请求次数与响应字节数，线程安全"""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, response):
+        with self._lock:
+            self.requests += 1
+            if response is not None:
+                self.bytes += len(response.content or b"")
+
+    def __str__(self):
+        return f"请求 {self.requests} 次，共 {self.bytes / 1024:.1f} KB"
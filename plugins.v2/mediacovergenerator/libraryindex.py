@@ -0,0 +1,46 @@
+"""
+媒体库路径索引
+
+Locations 按目录层级建成前缀树，查找一个路径所属的媒体库只需沿路径走一遍。
+"""
+import re
+
+
+_SEPARATORS = re.compile(r"[\\/]+")
+
+
+def split_path(path):
+    """将路径拆分为各级目录名，兼容 / 与 \\ 分隔符，忽略多余的分隔符"""
+    return [part for part in _SEPARATORS.split(str(path)) if part]
+
+
+class LibraryIndex:
+    """
+    媒体库目录（Locations）的前缀树
+
+    查找时返回包含该路径的最深一级目录所属的媒体库，目录按完整的层级匹配，
+    /media/tv 不会匹配 /media/tv2 下的路径
+    """
+
+    def __init__(self, libraries):
+        self._root = {}
+        for library in libraries or []:
+            for location in library.get('Locations') or []:
+                node = self._root
+                for part in split_path(location):
+                    node = node.setdefault(part, {})
+                # 多个媒体库包含同一目录时与原来的线性查找一致，取列表中靠前的媒体库
+                node.setdefault(None, library)
+
+    def find(self, path):
+        """返回路径所在的媒体库，找不到时返回 None"""
+        if not path:
+            return None
+        node = self._root
+        library = node.get(None)
+        for part in split_path(path):
+            node = node.get(part)
+            if node is None:
+                break
+            library = node.get(None, library)
+        return library
@@ -0,0 +1,176 @@
+"""
+按目标尺寸解码源图片
+
+JPEG 用 draft 在解码阶段缩小，其他格式用 reduce 整数倍缩小；
+文件句柄在返回前关闭，像素数过大的图片直接拒绝。
+"""
+import math
+import os
+
+from PIL import Image, ImageOps
+
+
+# 解码后保留的尺寸至少为目标尺寸的倍数，之后的 LANCZOS 缩放仍有足够的采样
+DRAFT_OVERSAMPLE = 2
+
+
+def _required_size(source_size, size, scale_mode):
+    """计算后续缩放（填充裁剪 / 等比缩放 / 拉伸）所需的最小源尺寸"""
+    width, height = source_size
+    target_width, target_height = size
+    if scale_mode == "cover":
+        scale = max(target_width / width, target_height / height)
+    elif scale_mode == "contain":
+        scale = min(target_width / width, target_height / height)
+    else:
+        return target_width, target_height
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def load_image(image_path, size=None, mode=None, scale_mode="cover", oversample=DRAFT_OVERSAMPLE):
+    """
+    加载图片，尽量在解码阶段缩小到接近需要的尺寸
+
+    参数:
+        image_path: 图片文件路径
+        size: 之后要缩放到的目标尺寸 (width, height)，为 None 时按原尺寸解码
+        mode: 转换到的颜色模式，为 None 时保持原模式
+        scale_mode: 之后的缩放方式，"cover" 为填充裁剪（ImageOps.fit），
+                    "contain" 为等比缩放（thumbnail），"stretch" 为直接拉伸（resize）
+        oversample: 解码尺寸至少为所需尺寸的倍数，模糊背景等对细节不敏感的场景可设为 1
+
+    返回:
+        已完全加载、与文件无关联的 PIL.Image 对象
+
+    异常:
+        Image.DecompressionBombError: 图片像素数超过 Image.MAX_IMAGE_PIXELS
+    """
+    with Image.open(image_path) as source:
+        width, height = source.size
+        if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+            raise Image.DecompressionBombError(
+                f"图片像素数 {width * height} 超过上限 {Image.MAX_IMAGE_PIXELS}: {image_path}"
+            )
+
+        required = None
+        if size:
+            required_width, required_height = _required_size(source.size, size, scale_mode)
+            required = (required_width * oversample, required_height * oversample)
+
+        if required and source.format == "JPEG":
+            source.draft(None, required)
+        source.load()
+
+        img = source
+        if required:
+            factor = min(source.width // required[0], source.height // required[1])
+            if factor >= 2:
+                img = source.reduce(factor)
+
+        # 关闭文件时会释放 source 的像素数据，返回的必须是新对象
+        if mode and img.mode != mode:
+            return img.convert(mode)
+        return img.copy() if img is source else img
+
+
+class ImageSource:
+    """
+    单次渲染中的一个图片文件：只解码一次，按需派生并缓存 RGB、RGBA、缩略图和填充裁剪等视图
+
+    解码尺寸取所有已登记需要（require 或获取视图时的参数）中的最大值；
+    先登记全部需要再获取视图即可保证只解码一次，之后出现更大的需要时才会重新解码
+    """
+
+    def __init__(self, image_path):
+        self.path = image_path
+        self.decode_count = 0
+        self._image = None
+        self._source_size = None
+        self._requirements = set()
+        self._views = {}
+
+    def require(self, size=None, scale_mode="cover", oversample=DRAFT_OVERSAMPLE):
+        """登记一次后续缩放的尺寸需要，参数与 load_image 相同；size 为 None 表示需要原尺寸"""
+        self._requirements.add((tuple(size) if size else None, scale_mode, oversample))
+        return self
+
+    def _required_decode_size(self):
+        """满足所有已登记需要的最小解码尺寸"""
+        source_width, source_height = self._source_size
+        required_width, required_height = 1, 1
+        for size, scale_mode, oversample in self._requirements:
+            if size is None:
+                return source_width, source_height
+            width, height = _required_size(self._source_size, size, scale_mode)
+            required_width = max(required_width, min(source_width, width * oversample))
+            required_height = max(required_height, min(source_height, height * oversample))
+        return required_width, required_height
+
+    def image(self, size=None, scale_mode="cover", oversample=DRAFT_OVERSAMPLE):
+        """
+        返回保持原颜色模式的解码图片，参数与 load_image 相同
+
+        返回的对象为共享对象，调用方不能原地修改
+        """
+        self.require(size, scale_mode, oversample)
+        if self._source_size is None:
+            with Image.open(self.path) as header:
+                self._source_size = header.size
+        required_width, required_height = self._required_decode_size()
+        # draft 按整数倍缩小时向上取整，允许一个像素的误差
+        if (self._image is None or self._image.width < required_width - 1
+                or self._image.height < required_height - 1):
+            self._image = load_image(self.path, (required_width, required_height), scale_mode="stretch", oversample=1)
+            self._views = {}
+            self.decode_count += 1
+        return self._image
+
+    def _view(self, key, build):
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = build()
+        return view
+
+    def rgb(self, size=None, scale_mode="cover", oversample=DRAFT_OVERSAMPLE):
+        """返回 RGB 模式的解码图片（共享对象）"""
+        image = self.image(size, scale_mode, oversample)
+        return self._view("RGB", lambda: image if image.mode == "RGB" else image.convert("RGB"))
+
+    def rgba(self, size=None, scale_mode="cover", oversample=DRAFT_OVERSAMPLE):
+        """返回 RGBA 模式的解码图片（共享对象）"""
+        image = self.image(size, scale_mode, oversample)
+        return self._view("RGBA", lambda: image if image.mode == "RGBA" else image.convert("RGBA"))
+
+    def thumbnail(self, size):
+        """返回等比缩放到不超过 size 的 RGB 缩略图（共享对象），与 Image.thumbnail 一致"""
+        image = self.rgb(size, "contain")
+
+        def build():
+            thumb = image.copy()
+            thumb.thumbnail(size)
+            return thumb
+        return self._view(("thumbnail", tuple(size)), build)
+
+    def fit(self, size, method=Image.Resampling.LANCZOS):
+        """返回填充裁剪到 size 的图片（共享对象，保持原颜色模式），与 ImageOps.fit 一致"""
+        image = self.image(size, "cover")
+        return self._view(("fit", tuple(size)), lambda: ImageOps.fit(image, size, method=method))
+
+
+class RenderSources:
+    """单次渲染用到的所有图片文件，同一路径只对应一个 ImageSource"""
+
+    def __init__(self):
+        self._sources = {}
+
+    def get(self, image_path):
+        """获取路径对应的图片来源"""
+        key = os.path.realpath(str(image_path))
+        source = self._sources.get(key)
+        if source is None:
+            source = self._sources[key] = ImageSource(image_path)
+        return source
+
+    def decode_count(self):
+        """本次渲染中解码文件的总次数"""
+        return sum(source.decode_count for source in self._sources.values())
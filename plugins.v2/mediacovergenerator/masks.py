@@ -0,0 +1,85 @@
+"""
+圆角、斜线分割与羽化阴影遮罩的进程内缓存
+
+遮罩只取决于尺寸与参数，生成一次即可跨渲染复用。
+返回的 L 模式遮罩是共享对象，调用方只能读取（paste/composite/putalpha），不能原地修改。
+"""
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.plugins.mediacovergenerator.gradient import diagonal_gradient_mask
+
+
+# 每种遮罩最多缓存的数量，1920x1080 的遮罩约 2 MB
+MASK_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def rounded_rect_mask(size, radius, supersample=1):
+    """
+    创建圆角矩形遮罩
+
+    参数:
+        size: 遮罩尺寸 (width, height)
+        radius: 圆角半径
+        supersample: 超采样倍数，大于 1 时在放大的遮罩上绘制后缩小，消除圆角锯齿
+
+    返回:
+        L 模式遮罩，圆角矩形内为 255
+    """
+    width, height = size
+    factor = max(1, int(supersample))
+    mask = Image.new("L", (width * factor, height * factor), 0)
+    ImageDraw.Draw(mask).rounded_rectangle(
+        [(0, 0), (width * factor, height * factor)],
+        radius=radius * factor,
+        fill=255,
+    )
+    if factor > 1:
+        mask = mask.resize((width, height), Image.Resampling.LANCZOS)
+    return mask
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def diagonal_split_mask(size, top_x, bottom_x, feather=0, inside=255, outside=0):
+    """
+    创建斜线分割遮罩，参数与 gradient.diagonal_gradient_mask 相同
+
+    返回:
+        L 模式遮罩，分割线左侧为 inside，右侧为 outside
+    """
+    width, height = size
+    return diagonal_gradient_mask(width, height, top_x, bottom_x, feather=feather, inside=inside, outside=outside)
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def diagonal_shadow_mask(size, top_x, bottom_x, shadow_width, blur_radius):
+    """
+    创建沿斜线分割的羽化阴影遮罩：紧贴分割线右侧的窄条经高斯模糊得到柔和的阴影
+
+    参数:
+        size: 遮罩尺寸 (width, height)
+        top_x: 分割线在顶部的 x 坐标
+        bottom_x: 分割线在底部的 x 坐标
+        shadow_width: 阴影条的宽度
+        blur_radius: 高斯模糊半径
+
+    返回:
+        L 模式遮罩
+    """
+    width, height = size
+    mask = Image.new("L", size, 0)
+    # 向左偏移5像素，确保阴影与分割线之间没有空隙
+    ImageDraw.Draw(mask).polygon(
+        [
+            (top_x - 5, 0),
+            (top_x - 5 + shadow_width, 0),
+            (bottom_x - 5 + shadow_width, height),
+            (bottom_x - 5, height),
+        ],
+        fill=255,
+    )
+    if blur_radius > 0:
+        mask = mask.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+    return mask
@@ -0,0 +1,188 @@
+"""从海报中提取主色与马卡龙配色，量化、计数与过滤都在 NumPy 数组上完成"""
+import numpy as np
+from PIL import Image
+
+from app.plugins.mediacovergenerator.loader import load_image
+
+
+# 每个通道保留的位数，相近的颜色会被归入同一个桶，减少逐像素统计的噪声
+PALETTE_BITS = 5
+
+
+def rgb_to_hsv_array(rgb):
+    """将 (N, 3) 的 RGB 数组 (0-255) 转换为 (N, 3) 的 HSV 数组 (0-1)，与 colorsys.rgb_to_hsv 一致"""
+    rgb = np.asarray(rgb, dtype=np.float64).reshape(-1, 3) / 255.0
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    delta = maxc - minc
+    v = maxc
+    s = np.divide(delta, maxc, out=np.zeros_like(maxc), where=maxc > 0)
+    safe_delta = np.where(delta > 0, delta, 1.0)
+    rc = (maxc - r) / safe_delta
+    gc = (maxc - g) / safe_delta
+    bc = (maxc - b) / safe_delta
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(delta > 0, (h / 6.0) % 1.0, 0.0)
+    return np.stack([h, s, v], axis=1)
+
+
+def hsv_to_rgb_array(hsv):
+    """将 (N, 3) 的 HSV 数组 (0-1) 转换为 (N, 3) 的 RGB 整数数组，与 int(colorsys.hsv_to_rgb(...) * 255) 一致"""
+    hsv = np.asarray(hsv, dtype=np.float64).reshape(-1, 3)
+    h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+    i = np.floor(h * 6.0)
+    f = h * 6.0 - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i.astype(np.int64) % 6
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    gray = s == 0.0
+    rgb = np.stack([np.where(gray, v, r), np.where(gray, v, g), np.where(gray, v, b)], axis=1)
+    return (rgb * 255).astype(np.int64)
+
+
+def not_black_white_gray_mask(pixels, threshold=20, gray_diff_threshold=10):
+    """返回 (N,) 布尔数组：像素既不是黑、白、灰，也不是接近黑、白"""
+    pixels = pixels.astype(np.int16)
+    r, g, b = pixels[:, 0], pixels[:, 1], pixels[:, 2]
+    near_black = (r < threshold) & (g < threshold) & (b < threshold)
+    near_white = (r > 255 - threshold) & (g > 255 - threshold) & (b > 255 - threshold)
+    gray = (np.abs(r - g) < gray_diff_threshold) \
+        & (np.abs(g - b) < gray_diff_threshold) \
+        & (np.abs(r - b) < gray_diff_threshold)
+    return ~(near_black | near_white | gray)
+
+
+def most_common_colors(pixels, count, bits=PALETTE_BITS):
+    """
+    统计出现最多的颜色
+
+    参数:
+        pixels: (N, 3) 的 uint8 RGB 数组
+        count: 返回的颜色数量
+        bits: 每个通道量化后保留的位数，8 为不量化
+
+    返回:
+        [((r, g, b), 像素数), ...]，按像素数从多到少排列，数量相同时先出现的在前；
+        每个颜色取该量化桶内所有像素的平均值
+    """
+    if len(pixels) == 0:
+        return []
+    shift = 8 - bits
+    quantized = (pixels >> shift).astype(np.uint32)
+    packed = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+    _, first_index, inverse, counts = np.unique(packed, return_index=True, return_inverse=True, return_counts=True)
+    order = np.lexsort((first_index, -counts))[:count]
+    sums = np.stack([np.bincount(inverse, weights=pixels[:, c], minlength=len(counts)) for c in range(3)], axis=1)
+    means = np.rint(sums[order] / counts[order, None]).astype(np.int64)
+    return [(tuple(int(v) for v in color), int(n)) for color, n in zip(means, counts[order])]
+
+
+def _thumbnail_pixels(image, size):
+    """缩小图片后返回 (N, 3) 的 RGB 像素数组"""
+    img = image.copy()
+    img.thumbnail(size)
+    return np.asarray(img.convert("RGB"), dtype=np.uint8).reshape(-1, 3)
+
+
+def _clamp_hsv(colors, saturation_range, value_range):
+    """将候选颜色的饱和度和亮度限制到指定范围，返回 (h, 调整后的 RGB 列表)"""
+    hsv = rgb_to_hsv_array(colors)
+    hsv[:, 1] = np.clip(hsv[:, 1], *saturation_range)
+    hsv[:, 2] = np.clip(hsv[:, 2], *value_range)
+    return hsv, [tuple(int(v) for v in rgb) for rgb in hsv_to_rgb_array(hsv)]
+
+
+def find_dominant_vibrant_colors(image, num_colors=5):
+    """
+    从图像中提取出现次数较多的前 N 种非黑非白非灰的颜色，
+    并将其调整到接近马卡龙色系。
+    """
+    pixels = _thumbnail_pixels(image, (100, 100))
+    pixels = pixels[not_black_white_gray_mask(pixels)]
+    dominant_colors = most_common_colors(pixels, num_colors * 3)  # 提取更多候选
+    if not dominant_colors:
+        return []
+
+    hsv, adjusted = _clamp_hsv([color for color, _ in dominant_colors], (0.2, 0.7), (0.55, 0.85))
+    macaron_colors = []
+    seen_hues = set()  # 避免提取过于相似的颜色
+    for (h, _, _), adjusted_rgb in zip(hsv, adjusted):
+        hue_degree = int(h * 360)
+        is_similar_hue = any(abs(hue_degree - seen) < 15 for seen in seen_hues)  # 15度范围内的色调认为是相似的
+        if not is_similar_hue and adjusted_rgb not in macaron_colors:
+            macaron_colors.append(adjusted_rgb)
+            seen_hues.add(hue_degree)
+            if len(macaron_colors) >= num_colors:
+                break
+    return macaron_colors
+
+
+def _hsv_distance(hsv1, hsv2):
+    """计算两个颜色在HSV空间中的距离，色调在环形空间中且权重更高"""
+    h_dist = min(abs(hsv1[0] - hsv2[0]), 1 - abs(hsv1[0] - hsv2[0]))
+    return h_dist * 5 + abs(hsv1[1] - hsv2[1]) + abs(hsv1[2] - hsv2[2])
+
+
+def find_dominant_macaron_colors(image, num_colors=5):
+    """
+    从图像中提取主要颜色并调整为马卡龙风格：
+    1. 过滤掉黑白灰颜色
+    2. 从剩余颜色中找到出现频率最高的几种
+    3. 调整这些颜色使其接近马卡龙风格
+    4. 确保提取的颜色之间有足够的差异
+    """
+    pixels = _thumbnail_pixels(image, (150, 150))
+    pixels = pixels[not_black_white_gray_mask(pixels)]
+    candidate_colors = most_common_colors(pixels, num_colors * 5)  # 提取更多候选颜色
+    if not candidate_colors:
+        return []
+
+    _, adjusted = _clamp_hsv([color for color, _ in candidate_colors], (0.3, 0.7), (0.6, 0.85))
+    # 距离需按调整后 RGB 的 HSV 计算，与取整后的颜色保持一致
+    adjusted_hsv = rgb_to_hsv_array(adjusted)
+    min_color_distance = 0.15  # 颜色差异阈值
+    macaron_colors = []
+    macaron_hsv = []
+    for adjusted_color, hsv in zip(adjusted, adjusted_hsv):
+        if not any(_hsv_distance(hsv, existing) < min_color_distance for existing in macaron_hsv):
+            macaron_colors.append(adjusted_color)
+            macaron_hsv.append(hsv)
+            if len(macaron_colors) >= num_colors:
+                break
+    return macaron_colors
+
+
+def get_poster_primary_color(image):
+    """
+    分析图片并提取主色调
+
+    参数:
+        image: PIL.Image对象或图片文件路径
+
+    返回:
+        [((r, g, b, 255), 像素数), ...] 最多 10 种颜色，失败时返回默认颜色
+    """
+    try:
+        if isinstance(image, Image.Image):
+            img = image.resize((100, 150), Image.LANCZOS)
+        else:
+            img = load_image(image, (100, 150), scale_mode="stretch").resize((100, 150), Image.LANCZOS)
+        pixels = np.asarray(img.convert("RGBA"), dtype=np.uint8).reshape(-1, 4)
+
+        # 过滤掉透明度低以及过暗或过亮的像素
+        brightness = pixels[:, :3].astype(np.uint16).sum(axis=1) / 3
+        keep = (pixels[:, 3] >= 200) & (brightness >= 30) & (brightness <= 220)
+        # 如果过滤后没有像素，使用全部不透明像素
+        if not keep.any():
+            keep = pixels[:, 3] > 100
+        if not keep.any():
+            return (150, 100, 50, 255)
+
+        return [(color + (255,), count) for color, count in most_common_colors(pixels[keep, :3], 10)]
+    except Exception:
+        return [(150, 100, 50, 255)]
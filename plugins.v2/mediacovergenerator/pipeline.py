@@ -0,0 +1,138 @@
+"""
+每个阶段一个工作线程、阶段之间以有界队列相连的流水线
+
+全量更新时，下一个媒体库的图片下载与当前媒体库的渲染、上传同时进行。
+"""
+import queue
+import threading
+import time
+
+from app.log import logger
+
+
+# 阶段之间最多积压的任务数，限制提前下载的媒体库数量
+PIPELINE_QUEUE_SIZE = 2
+
+# 等待同 key 任务完成时检查停止信号的间隔（秒）
+_WAIT_INTERVAL = 0.5
+
+_DONE = object()
+
+
+class Pipeline:
+    """
+    将任务依次交给各阶段处理，阶段函数的返回值作为下一阶段的输入，返回 None 或 False 时任务到此结束
+
+    stop_event 被设置后不再接收新任务，各阶段放弃队列中尚未开始的任务，正在处理的任务完成后退出
+    """
+
+    def __init__(self, stages, stop_event=None, queue_size=PIPELINE_QUEUE_SIZE, key=None, exclusive_until=0):
+        """
+        参数:
+            stages: [(阶段名称, 处理函数), ...]
+            stop_event: 停止信号 threading.Event
+            queue_size: 阶段之间队列的容量
+            key: 从任务计算 key 的函数，同一 key 的任务不会同时处于第 0 到 exclusive_until 阶段，
+                 用于保护同一任务目录不被下一个任务提前覆盖
+            exclusive_until: key 互斥覆盖到的最后一个阶段序号
+        """
+        self.stages = stages
+        self.stop_event = stop_event or threading.Event()
+        self.queue_size = queue_size
+        self.key = key
+        self.exclusive_until = exclusive_until
+        self.stats = {name: {"count": 0, "busy": 0.0} for name, _ in stages}
+        self._active_keys = set()
+        self._key_condition = threading.Condition()
+
+    def _acquire_key(self, key):
+        """等待同 key 的任务离开互斥阶段，停止时返回 False"""
+        with self._key_condition:
+            while key in self._active_keys:
+                if self.stop_event.is_set():
+                    return False
+                self._key_condition.wait(_WAIT_INTERVAL)
+            self._active_keys.add(key)
+            return True
+
+    def _release_key(self, key):
+        with self._key_condition:
+            self._active_keys.discard(key)
+            self._key_condition.notify_all()
+
+    def _process(self, index, value):
+        """执行一个阶段，异常视为任务失败"""
+        name, func = self.stages[index]
+        start = time.perf_counter()
+        try:
+            return func(value)
+        except Exception as err:
+            logger.error(f"流水线阶段 {name} 处理失败：{str(err)}")
+            return None
+        finally:
+            self.stats[name]["count"] += 1
+            self.stats[name]["busy"] += time.perf_counter() - start
+
+    def _worker(self, index, inbox, outbox, results):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                if outbox is not None:
+                    outbox.put(_DONE)
+                return
+            key, value = item
+            # 进入第 1 到 exclusive_until 阶段的任务都已在第 0 阶段取得 key
+            holds_key = self.key is not None and 0 < index <= self.exclusive_until
+            result = None
+            if not self.stop_event.is_set():
+                if index == 0 and self.key:
+                    holds_key = self._acquire_key(key)
+                    if holds_key:
+                        result = self._process(index, value)
+                else:
+                    result = self._process(index, value)
+            # 只释放本任务取得的 key，未取得时同 key 的其他任务可能仍在互斥阶段中
+            if holds_key and (not result or index == self.exclusive_until):
+                self._release_key(key)
+            if not result:
+                continue
+            if outbox is not None:
+                outbox.put((key, result))
+            else:
+                results.append(result)
+
+    def run(self, items):
+        """
+        处理全部任务，阻塞直到所有阶段结束
+
+        参数:
+            items: 任务的可迭代对象，按需逐个读取
+
+        返回:
+            最后一个阶段的非空返回值列表
+        """
+        results = []
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for index, (name, _) in enumerate(self.stages):
+            outbox = queues[index + 1] if index + 1 < len(self.stages) else None
+            thread = threading.Thread(target=self._worker, name=f"pipeline-{name}",
+                                      args=(index, queues[index], outbox, results), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        start = time.perf_counter()
+        try:
+            for value in items:
+                if self.stop_event.is_set():
+                    break
+                queues[0].put((self.key(value) if self.key else None, value))
+        finally:
+            queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - start
+        busy = "，".join(f"{name} {stat['count']} 个 {stat['busy']:.1f} 秒" for name, stat in self.stats.items())
+        logger.info(f"流水线完成，总耗时 {elapsed:.1f} 秒（{busy}）")
+        return results
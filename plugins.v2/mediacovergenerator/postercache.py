@@ -0,0 +1,132 @@
+"""
+按 (服务器, 媒体项 ID, 图片类型, 图片 tag) 寻址的海报磁盘缓存
+
+tag 不变的图片不会重复下载，同一影片出现在多个媒体库中也只保存一份；总大小超过配额时按最近使用时间淘汰。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from app.log import logger
+
+
+# 默认缓存配额（MB）
+POSTER_CACHE_SIZE = 500
+
+
+class PosterCache:
+    """
+    内容寻址的海报缓存，线程安全
+
+    文件修改时间作为最近使用时间，命中时更新，重启后仍能按 LRU 顺序淘汰
+    """
+
+    def __init__(self, cache_dir, max_bytes=POSTER_CACHE_SIZE * 1024 * 1024):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(server, item_id, image_type, tag):
+        """缓存键，tag 为空时返回 None 表示不可缓存"""
+        if item_id in (None, "") or not tag:
+            return None
+        return str(server), str(item_id), str(image_type), str(tag)
+
+    def _path(self, key):
+        digest = hashlib.sha1("/".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.img")
+
+    def _load_entries(self):
+        """首次使用时扫描缓存目录，按修改时间重建 LRU 顺序"""
+        if self._entries is not None:
+            return
+        files = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, names in os.walk(self.cache_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if name.endswith(".tmp"):
+                        # 上次写入中断留下的临时文件
+                        self._remove(path)
+                        continue
+                    files.append((stat.st_mtime, path, stat.st_size))
+        files.sort()
+        self._entries = OrderedDict((path, size) for _, path, size in files)
+        self._total = sum(self._entries.values())
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, key):
+        """读取缓存的图片内容，未命中返回 None"""
+        if key is None:
+            return None
+        path = self._path(key)
+        with self._lock:
+            self._load_entries()
+            if path not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total -= self._entries.pop(path, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, key, content):
+        """写入图片内容，之后按配额淘汰最久未使用的图片"""
+        if key is None or not content or len(content) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as err:
+            logger.warning(f"写入海报缓存失败：{str(err)}")
+            self._remove(tmp_path)
+            return
+        with self._lock:
+            self._load_entries()
+            self._total += len(content) - self._entries.pop(path, 0)
+            self._entries[path] = len(content)
+            evicted = []
+            while self._total > self.max_bytes and self._entries:
+                old_path, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_path)
+        for old_path in evicted:
+            self._remove(old_path)
+        if evicted:
+            logger.debug(f"海报缓存超出配额，淘汰 {len(evicted)} 张图片")
+
+    def stats(self):
+        """返回命中次数、未命中次数、图片数量与总大小（字节）"""
+        with self._lock:
+            self._load_entries()
+            return {"hits": self.hits, "misses": self.misses,
+                    "count": len(self._entries), "bytes": self._total}
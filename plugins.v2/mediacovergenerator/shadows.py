@@ -0,0 +1,49 @@
+"""
+L 模式的阴影透明度精灵，按几何参数缓存，合成时再着色
+
+同一次渲染中尺寸和参数相同的海报共用一张阴影，只模糊一次。
+"""
+from functools import lru_cache
+
+from PIL import Image, ImageFilter
+
+from app.plugins.mediacovergenerator.masks import rounded_rect_mask
+
+
+# 最多缓存的阴影遮罩数量
+SHADOW_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=SHADOW_CACHE_SIZE)
+def shadow_mask(size, blur_radius, opacity=255, corner_radius=0, margin=(0, 0, 0, 0), angle=0):
+    """
+    创建模糊后的阴影透明度遮罩
+
+    参数:
+        size: 投射阴影的图片尺寸 (width, height)
+        blur_radius: 高斯模糊半径
+        opacity: 阴影不透明度 (0-255)
+        corner_radius: 阴影形状的圆角半径，0 为直角矩形；圆角遮罩与 add_rounded_corners 一致（2 倍超采样）
+        margin: 阴影形状四周留出的空白 (left, top, right, bottom)，遮罩尺寸为图片尺寸加上空白
+        angle: 模糊后的旋转角度（逆时针），非 0 时按 Image.rotate(expand=True) 扩展画布
+
+    返回:
+        L 模式遮罩，为共享对象，调用方不能原地修改
+    """
+    width, height = size
+    left, top, right, bottom = margin
+    mask = Image.new("L", (width + left + right, height + top + bottom), 0)
+    shape = rounded_rect_mask(size, corner_radius, supersample=2) if corner_radius > 0 else None
+    mask.paste(int(opacity), (left, top, left + width, top + height), shape)
+    if blur_radius > 0:
+        mask = mask.filter(ImageFilter.GaussianBlur(blur_radius))
+    if angle:
+        mask = mask.rotate(angle, Image.BICUBIC, expand=True)
+    return mask
+
+
+def tint_shadow(mask, color=(0, 0, 0)):
+    """将阴影遮罩着色为 RGBA 阴影图层"""
+    shadow = Image.new("RGBA", mask.size, tuple(color[:3]))
+    shadow.putalpha(mask)
+    return shadow
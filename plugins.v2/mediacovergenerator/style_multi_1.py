@@ -1,14 +1,20 @@
-import base64
-from collections import Counter
-import io
 from pathlib import Path
-from PIL import Image, ImageFilter, ImageDraw, ImageFont, ImageOps
-import numpy as np
+from PIL import Image, ImageDraw
 import os
 import math
 import random  # 添加随机模块
 import colorsys
 from app.log import logger
+from app.plugins.mediacovergenerator.affine import paste_affine, rotated_size, rotation_affine
+from app.plugins.mediacovergenerator.background import create_blended_background
+from app.plugins.mediacovergenerator.encoder import encode_image
+from app.plugins.mediacovergenerator.fonts import get_font
+from app.plugins.mediacovergenerator.gradient import power_gradient_mask
+from app.plugins.mediacovergenerator.loader import RenderSources
+from app.plugins.mediacovergenerator.masks import rounded_rect_mask
+from app.plugins.mediacovergenerator.palette import find_dominant_vibrant_colors, get_poster_primary_color
+from app.plugins.mediacovergenerator.shadows import shadow_mask, tint_shadow
+from app.plugins.mediacovergenerator.textlayer import TextLayer
 
 """ 
 代码修改自 https://github.com/HappyQuQu/jellyfin-library-poster/blob/main/gen_poster.py
@@ -44,20 +50,15 @@ def add_shadow(img, offset=(5, 5), shadow_color=(0, 0, 0, 100), blur_radius=3):
     返回:
         添加了阴影的新图片
     """
-    # 创建一个透明背景，比原图大一些，以容纳阴影
-    shadow_width = img.width + offset[0] + blur_radius * 2
-    shadow_height = img.height + offset[1] + blur_radius * 2
-
-    shadow = Image.new("RGBA", (shadow_width, shadow_height), (0, 0, 0, 0))
-
-    # 创建阴影层
-    shadow_layer = Image.new("RGBA", img.size, shadow_color)
-
-    # 将阴影层粘贴到偏移位置
-    shadow.paste(shadow_layer, (blur_radius + offset[0], blur_radius + offset[1]))
-
-    # 模糊阴影
-    shadow = shadow.filter(ImageFilter.GaussianBlur(blur_radius))
+    # 阴影遮罩按尺寸与参数缓存，同尺寸的海报只模糊一次
+    opacity = shadow_color[3] if len(shadow_color) > 3 else 255
+    mask = shadow_mask(
+        img.size,
+        blur_radius,
+        opacity,
+        margin=(blur_radius + offset[0], blur_radius + offset[1], blur_radius, blur_radius),
+    )
+    shadow = tint_shadow(mask, shadow_color)
 
     # 创建结果图像
     result = Image.new("RGBA", shadow.size, (0, 0, 0, 0))
@@ -97,11 +98,10 @@ def draw_text_on_image(
     """
     # 创建一个可绘制的图像副本
     img_copy = image.copy()
-    text_layer = Image.new('RGBA', img_copy.size, (255, 255, 255, 0))
-    shadow_layer = Image.new('RGBA', img_copy.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(text_layer)
-    shadow_draw = ImageDraw.Draw(shadow_layer)
-    font = ImageFont.truetype(font_path, font_size)
+    # 文字和阴影图层只覆盖文字所在区域
+    text_layer = TextLayer((255, 255, 255, 0))
+    shadow_layer = TextLayer((0, 0, 0, 0))
+    font = get_font(font_path, font_size)
     
     # 如果需要添加阴影
     if shadow:
@@ -124,17 +124,16 @@ def draw_text_on_image(
                 raise ValueError("shadow_color 格式不正确")  # 抛出异常，明确错误
 
         for offset in range(3, shadow_offset + 1, 2):
-            shadow_draw.text(
+            shadow_layer.text(
                 (position[0] + offset, position[1] + offset),
                 text,
                 font=font,
                 fill=shadow_color_with_alpha
             )
     # 绘制主文字
-    draw.text(position, text, font=font, fill=fill_color)
-    blurred_shadow = shadow_layer.filter(ImageFilter.GaussianBlur(radius=shadow_offset))
-    combined = Image.alpha_composite(img_copy, blurred_shadow)
-    img_copy = Image.alpha_composite(combined, text_layer)
+    text_layer.text(position, text, font=font, fill=fill_color)
+    shadow_layer.composite(img_copy, blur_radius=shadow_offset)
+    text_layer.composite(img_copy)
 
     return img_copy
 
@@ -175,9 +174,9 @@ def draw_multiline_text_on_image(
     """
     # 创建一个可绘制的图像副本
     img_copy = image.copy()
-    text_layer = Image.new('RGBA', img_copy.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(text_layer)
-    font = ImageFont.truetype(font_path, font_size)
+    # 文字图层只覆盖文字所在区域
+    draw = TextLayer((255, 255, 255, 0))
+    font = get_font(font_path, font_size)
 
     # 按空格分割文本
     lines = text.split(" ")
@@ -216,7 +215,7 @@ def draw_multiline_text_on_image(
                     fill=shadow_color_with_alpha
                 )
         draw.text(position, text, font=font, fill=fill_color)
-        img_copy = Image.alpha_composite(img_copy, text_layer)
+        draw.composite(img_copy)
         return img_copy, 1
 
     # 绘制多行文本
@@ -233,22 +232,23 @@ def draw_multiline_text_on_image(
                     fill=shadow_color_with_alpha
                 )
         draw.text((x, current_y), line, font=font, fill=fill_color)
-    img_copy = Image.alpha_composite(img_copy, text_layer)
+    draw.composite(img_copy)
     return img_copy, len(lines)
 
 
-def get_random_color(image_path):
+def get_random_color(image_source):
     """
     获取图片随机位置的颜色
 
     参数:
-        image_path: 图片文件路径
+        image_source: 图片来源（ImageSource）
 
     返回:
         随机点颜色，RGBA格式
     """
     try:
-        img = Image.open(image_path)
+        # 只需要取色，缩略图尺寸即可，已解码的更大图片会直接复用
+        img = image_source.image((200, 200), scale_mode="contain")
         # 获取图片尺寸
         width, height = img.size
 
@@ -443,20 +443,9 @@ def create_gradient_background(width, height, color=None):
     left_image = Image.new("RGBA", (width, height), selected_color)
     right_image = Image.new("RGBA", (width, height), color2)
     
-    # 创建渐变遮罩（从黑到白的横向线性渐变）
-    mask = Image.new("L", (width, height), 0)
-    mask_data = []
-    
-    # 生成遮罩数据，使用更加平滑的过渡
-    for y in range(height):
-        for x in range(width):
-            # 计算从左到右的渐变值 (0-255)
-            # 使用更加非线性的渐变，使左侧深色区域更大
-            mask_value = int(255.0 * (x / width) ** 0.7)  # 从0.85改为0.7
-            mask_data.append(mask_value)
-    
-    # 应用遮罩数据到遮罩图像
-    mask.putdata(mask_data)
+    # 创建渐变遮罩（从黑到白的横向幂曲线渐变）
+    # 使用更加非线性的渐变，使左侧深色区域更大
+    mask = power_gradient_mask(width, height, exponent=0.7)  # 从0.85改为0.7
     
     # 使用遮罩合成左右两个图像
     # 遮罩中黑色部分(0)显示left_image，白色部分(255)显示right_image
@@ -465,96 +454,12 @@ def create_gradient_background(width, height, color=None):
     return gradient
 
 
-def get_poster_primary_color(image_path):
-    """
-    分析图片并提取主色调
-    
-    参数:
-        image_path: 图片文件路径
-        
-    返回:
-        主色调颜色，RGBA格式
-    """
-    try:
-        from collections import Counter
-        
-        # 打开图片
-        img = Image.open(image_path)
-        
-        # 缩小图片尺寸以加快处理速度
-        img = img.resize((100, 150), Image.LANCZOS)
-        
-        # 确保图片为RGBA模式
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-            
-        # 获取图片中心部分的像素数据（避免边框和角落）
-        # width, height = img.size
-        # center_x1 = int(width * 0.2)
-        # center_y1 = int(height * 0.2)
-        # center_x2 = int(width * 0.8)
-        # center_y2 = int(height * 0.8)
-        
-        # # 裁剪出中心区域
-        # center_img = img.crop((center_x1, center_y1, center_x2, center_y2))
-
-        # 获取所有像素
-        pixels = list(img.getdata())
-        
-        # 过滤掉接近黑色和白色的像素，以及透明度低的像素
-        filtered_pixels = []
-        for pixel in pixels:
-            r, g, b, a = pixel
-            
-            # 跳过透明度低的像素
-            if a < 200:
-                continue
-                
-            # 计算亮度
-            brightness = (r + g + b) / 3
-            
-            # 跳过过暗或过亮的像素
-            if brightness < 30 or brightness > 220:
-                continue
-                
-            # 添加到过滤后的列表
-            filtered_pixels.append((r, g, b, 255))
-            
-        # 如果过滤后没有像素，使用全部像素
-        if not filtered_pixels:
-            filtered_pixels = [(p[0], p[1], p[2], 255) for p in pixels if p[3] > 100]
-            
-        # 如果仍然没有像素，返回默认颜色
-        if not filtered_pixels:
-            return (150, 100, 50, 255)
-            
-        # 使用Counter找到出现最多的颜色
-        color_counter = Counter(filtered_pixels)
-        common_colors = color_counter.most_common(10)
-        
-        # 如果找到了颜色，返回最常见的颜色
-        if common_colors:
-            return common_colors
-        
-        # 如果无法找到主色调，使用平均值
-        r_avg = sum(p[0] for p in filtered_pixels) // len(filtered_pixels)
-        g_avg = sum(p[1] for p in filtered_pixels) // len(filtered_pixels)
-        b_avg = sum(p[2] for p in filtered_pixels) // len(filtered_pixels)
-        
-        return [(r_avg, g_avg, b_avg, 255)]
-     
-        
-    except Exception as e:
-        # logger.error(f"获取图片主色调时出错: {e}")
-        # 返回默认颜色作为备选
-        return [(150, 100, 50, 255)]
-
-def create_blur_background(image_path, template_width, template_height, background_color, blur_size, color_ratio, lighten_gradient_strength=0.6):
+def create_blur_background(original_img, template_width, template_height, background_color, blur_size, color_ratio, lighten_gradient_strength=0.6, fast_blur=False):
     """
     创建模糊背景图像，将原始图像模糊化并与指定颜色混合，添加胶片颗粒效果
     
     参数:
-        image_path (str): 原始图像的路径
+        original_img (PIL.Image): 原始图像
         template_width (int): 模板宽度
         template_height (int): 模板高度
         color (tuple or list): 背景混合颜色列表或颜色元组，包含(R,G,B,A)格式的颜色
@@ -563,175 +468,20 @@ def create_blur_background(image_path, template_width, template_height, backgrou
         PIL.Image: 处理后的背景图像
     """
     
-    # 加载原始图像
-    original_img = Image.open(image_path)
-    
-    # 确保原图像有正确的模式（RGB或RGBA）
-    if original_img.mode != 'RGBA':
-        original_img = original_img.convert('RGBA')
-    
-    canvas_size = (template_width, template_height)
-    
-    # 背景处理
-    bg_img = original_img.copy()
-    bg_img = ImageOps.fit(bg_img, canvas_size, method=Image.LANCZOS)
-    bg_img = bg_img.filter(ImageFilter.GaussianBlur(radius=int(blur_size)))
-
-    # 2. 与指定颜色混合
-    # 假设 select_suitable_color 和 darken_color 函数存在且正常工作
+    # 模糊原图并与加深后的颜色混合，叠加从左到右颜色变浅的渐变，再添加胶片颗粒效果
     actual_color = darken_color(background_color, 0.85)
-    
-    # 确保 bg_color 是元组形式的RGB颜色
-    if len(actual_color) >= 3:
-        bg_color = (int(actual_color[0]), int(actual_color[1]), int(actual_color[2]))
-    else:
-        # 默认颜色，以防颜色格式不正确
-        bg_color = (0, 0, 0)
-
-    # 将背景图片与背景色混合
-    bg_img_array = np.array(bg_img, dtype=float)
-    height, width, channels = bg_img_array.shape
-    
-    # 创建和背景图片相同大小的颜色数组
-    bg_color_array = np.zeros_like(bg_img_array)
-    
-    # 填充RGB通道
-    for i in range(min(3, channels)):  
-        bg_color_array[:, :, i] = float(bg_color[i])
-    
-    # 如果有Alpha通道，设置为完全不透明
-    if channels == 4:
-        bg_color_array[:, :, 3] = 255.0
-    
-    # 混合背景图和颜色
-    blended_bg_array = bg_img_array * (1 - float(color_ratio)) + bg_color_array * float(color_ratio)
-    blended_bg_array = np.clip(blended_bg_array, 0, 255).astype(np.uint8)
-
-    # 转回PIL图像
-    mode = 'RGBA' if channels == 4 else 'RGB'
-    blended_bg_img = Image.fromarray(blended_bg_array, mode)
-
-    if blended_bg_img.mode != 'RGBA':
-        blended_bg_img = blended_bg_img.convert('RGBA')
-
-    # 3. 从左到右颜色变浅的渐变处理
-    if lighten_gradient_strength > 0:
-        gradient_mask = Image.new("L", canvas_size, 0)  
-        draw_mask = ImageDraw.Draw(gradient_mask)
-
-        for x in range(template_width):
-            max_alpha_for_gradient = int(255 * np.clip(lighten_gradient_strength, 0.0, 1.0))
-            alpha_value = int((x / template_width) * max_alpha_for_gradient)
-            draw_mask.line([(x, 0), (x, template_height)], fill=alpha_value)
-
-        # 创建一个白色的叠加层
-        lighten_layer = Image.new("RGBA", canvas_size, (255, 255, 255, 0))
-        lighten_layer.putalpha(gradient_mask)
-
-        blended_bg_img = Image.alpha_composite(blended_bg_img, lighten_layer)
-
-    # 4. 添加胶片颗粒效果
-    # 假设 add_film_grain 函数存在且正常工作
-    final_bg_img = add_film_grain(blended_bg_img, intensity=0.03)
-
-    return final_bg_img
-
-def add_film_grain(image, intensity=0.05):
-    """
-    为图像添加胶片颗粒效果
-    
-    参数:
-        image (PIL.Image): 输入图像
-        intensity (float): 颗粒强度，范围从0到1
-    
-    返回:
-        PIL.Image: 添加颗粒效果后的图像
-    """
-    # 获取图像模式
-    mode = image.mode
-    
-    # 转换为numpy数组
-    img_array = np.array(image, dtype=np.float32)
-    
-    # 确定通道数
-    if mode == 'RGBA':
-        # 只对RGB通道添加噪声
-        channels = img_array.shape[2]
-        for i in range(min(3, channels)):  # 只处理RGB通道
-            channel = img_array[:, :, i]
-            noise = np.random.normal(0, 255 * intensity, channel.shape)
-            img_array[:, :, i] = np.clip(channel + noise, 0, 255)
-    else:
-        # RGB或其他模式
-        noise = np.random.normal(0, 255 * intensity, img_array.shape)
-        img_array = np.clip(img_array + noise, 0, 255)
-    
-    # 转换回PIL图像
-    grainy_image = Image.fromarray(img_array.astype(np.uint8), mode)
-    
-    return grainy_image
-
-def is_not_black_white_gray_near(color, threshold=20):
-    """判断颜色既不是黑、白、灰，也不是接近黑、白。"""
-    r, g, b = color
-    if (r < threshold and g < threshold and b < threshold) or \
-       (r > 255 - threshold and g > 255 - threshold and b > 255 - threshold):
-        return False
-    gray_diff_threshold = 10
-    if abs(r - g) < gray_diff_threshold and abs(g - b) < gray_diff_threshold and abs(r - b) < gray_diff_threshold:
-        return False
-    return True
-
-def rgb_to_hsv(color):
-    """将 RGB 颜色转换为 HSV 颜色。"""
-    r, g, b = [x / 255.0 for x in color]
-    return colorsys.rgb_to_hsv(r, g, b)
-
-def hsv_to_rgb(h, s, v):
-    """将 HSV 颜色转换为 RGB 颜色。"""
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    return (int(r * 255), int(g * 255), int(b * 255))
-
-def adjust_to_macaron(h, s, v, target_saturation_range=(0.2, 0.7), target_value_range=(0.55, 0.85)):
-    """将颜色的饱和度和亮度调整到接近马卡龙色系的范围，同时避免颜色过亮。"""
-    adjusted_s = min(max(s, target_saturation_range[0]), target_saturation_range[1])
-    adjusted_v = min(max(v, target_value_range[0]), target_value_range[1])
-    return adjusted_s, adjusted_v
-
-def find_dominant_vibrant_colors(image, num_colors=5):
-    """
-    从图像中提取出现次数较多的前 N 种非黑非白非灰的颜色，
-    并将其调整到接近马卡龙色系。
-    """
-    img = image.copy()  
-    img.thumbnail((100, 100))
-    img = img.convert('RGB')
-    pixels = list(img.getdata())
-    filtered_pixels = [p for p in pixels if is_not_black_white_gray_near(p)]
-    if not filtered_pixels:
-        return []
-    color_counter = Counter(filtered_pixels)
-    dominant_colors = color_counter.most_common(num_colors * 3) # 提取更多候选
-
-    macaron_colors = []
-    seen_hues = set() # 避免提取过于相似的颜色
-
-    for color, count in dominant_colors:
-        h, s, v = rgb_to_hsv(color)
-        adjusted_s, adjusted_v = adjust_to_macaron(h, s, v)
-        adjusted_rgb = hsv_to_rgb(h, adjusted_s, adjusted_v)
-
-        # 可以加入一些色调的判断，例如避免过于接近的色调
-        hue_degree = int(h * 360)
-        is_similar_hue = any(abs(hue_degree - seen) < 15 for seen in seen_hues) # 15度范围内的色调认为是相似的
-
-        if not is_similar_hue and adjusted_rgb not in macaron_colors:
-            macaron_colors.append(adjusted_rgb)
-            seen_hues.add(hue_degree)
-            if len(macaron_colors) >= num_colors:
-                break
+    final_bg_img = create_blended_background(
+        original_img,
+        (template_width, template_height),
+        blur_size=blur_size,
+        color=actual_color,
+        color_ratio=color_ratio,
+        grain_intensity=0.03,
+        lighten_gradient_strength=lighten_gradient_strength,
+        fast_blur=fast_blur,
+    )
 
-    return macaron_colors
+    return final_bg_img.convert("RGBA")
 
 def darken_color(color, factor=0.7):
     """
@@ -741,20 +491,8 @@ def darken_color(color, factor=0.7):
     return (int(r * factor), int(g * factor), int(b * factor))
 
 
-def add_film_grain(image, intensity=0.05):
-    """添加胶片颗粒效果"""
-    img_array = np.array(image)
-    
-    # 创建随机噪点
-    noise = np.random.normal(0, intensity * 255, img_array.shape)
-    
-    # 应用噪点
-    img_array = img_array + noise
-    img_array = np.clip(img_array, 0, 255).astype(np.uint8)
-    
-    return Image.fromarray(img_array)
-
-def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur=False, blur_size=50, color_ratio=0.8):
+def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur=False, blur_size=50, color_ratio=0.8, fast_blur=False,
+                         output_format="webp", encode_preset="balanced"):
     """
     生成海报：多张图片以旋转列的形式排列在渐变背景上。
     输入:
@@ -764,7 +502,7 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
       zh_font_path: 首选的中文字体文件路径 (可以是None)。
       en_font_path: 首选的英文字体文件路径 (可以是None)。
     返回:
-      生成的PNG海报图片的base64编码字符串，失败则返回None。
+      编码后的海报图片（EncodedImage），失败则返回False。
     """
     """
     将多张电影海报排列成三列，每列三张，然后将每列作为整体旋转并放在渐变背景上
@@ -806,8 +544,18 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
         template_width = POSTER_GEN_CONFIG["CANVAS_WIDTH"]
         template_height = POSTER_GEN_CONFIG["CANVAS_HEIGHT"]
 
+        # 首图用于取色、背景和海报列，先登记全部尺寸需要，整个渲染只解码一次
+        sources = RenderSources()
+        first_source = sources.get(first_image_path)
+        first_source.require((100, 100), scale_mode="contain")
+        first_source.require((100, 150), scale_mode="stretch")
+        first_source.require((POSTER_GEN_CONFIG["CELL_WIDTH"], POSTER_GEN_CONFIG["CELL_HEIGHT"]))
+        if is_blur:
+            # 背景会被大幅模糊，按画布尺寸解码即可
+            first_source.require((template_width, template_height), oversample=1)
+
         # 加载首图并处理
-        color_img = Image.open(first_image_path).convert("RGB")        
+        color_img = first_source.thumbnail((100, 100))
         # 获取前景图中最鲜明的颜色
         vibrant_colors = find_dominant_vibrant_colors(color_img)
         
@@ -826,11 +574,11 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
         else:
             blur_color = random.choice(soft_colors) # 默认橙色
 
-        gradient_color = get_poster_primary_color(first_image_path)
+        gradient_color = get_poster_primary_color(first_source.rgb((100, 150), scale_mode="stretch"))
 
         # 创建渐变背景作为模板
         if is_blur:
-          colored_bg_img = create_blur_background(first_image_path, template_width, template_height, blur_color, blur_size, color_ratio)
+          colored_bg_img = create_blur_background(first_source.rgb((template_width, template_height), oversample=1), template_width, template_height, blur_color, blur_size, color_ratio, fast_blur=fast_blur)
         else:
           colored_bg_img = create_gradient_background(template_width, template_height, gradient_color)
 
@@ -907,27 +655,16 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
             # 在列画布上放置每张图片
             for row_index, poster_path in enumerate(column_posters):
                 try:
-                    # 打开海报
-                    poster = Image.open(poster_path)
-
-                    # 调整海报大小为固定尺寸
+                    # 打开海报并调整为固定尺寸（与首图相同的文件直接复用已解码的图片）
                     # resized_poster = poster.resize(
                     #     (cell_width, cell_height), Image.LANCZOS
                     # )
-                    resized_poster = ImageOps.fit(poster, (cell_width, cell_height), method=Image.LANCZOS)
+                    resized_poster = sources.get(poster_path).fit((cell_width, cell_height))
 
                     # 创建圆角遮罩（如果需要）
                     if corner_radius > 0:
-                        # 创建一个透明的遮罩
-                        mask = Image.new("L", (cell_width, cell_height), 0)
-
-                        # 绘制圆角
-                        draw = ImageDraw.Draw(mask)
-                        draw.rounded_rectangle(
-                            [(0, 0), (cell_width, cell_height)],
-                            radius=corner_radius,
-                            fill=255,
-                        )
+                        # 圆角遮罩（按尺寸与半径缓存）
+                        mask = rounded_rect_mask((cell_width, cell_height), corner_radius)
 
                         # 应用遮罩
                         poster_with_corners = Image.new(
@@ -975,7 +712,8 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
             #     )
 
             # 现在我们有了完整的一列图片，准备旋转它
-            # 创建一个足够大的画布来容纳旋转后的列
+            # 列的摆放位置沿用“居中放到旋转画布上再整体旋转”的几何关系，
+            # 但不再实际创建和旋转这张大画布，只对列实际覆盖的区域做一次仿射变换
             rotation_canvas_size = int(
                 math.sqrt(
                     (cell_width + shadow_extra_width) ** 2
@@ -983,29 +721,13 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
                 )
                 * 1.5
             )
-            rotation_canvas = Image.new(
-                "RGBA", (rotation_canvas_size, rotation_canvas_size), (0, 0, 0, 0)
+            rotated_width, rotated_height = rotated_size(
+                (rotation_canvas_size, rotation_canvas_size), rotation_angle
             )
 
-            # 将列图片放在旋转画布的中央
+            # 列图片在旋转画布上的位置（居中）
             paste_x = (rotation_canvas_size - cell_width) // 2
             paste_y = (rotation_canvas_size - column_height) // 2
-            rotation_canvas.paste(column_image, (paste_x, paste_y), column_image)
-
-            # 旋转整个列
-            rotated_column = rotation_canvas.rotate(
-                rotation_angle, Image.BICUBIC, expand=True
-            )
-
-            # 保存旋转后的列图像
-            # if save_columns:
-            #     column_rotated_path = os.path.join(
-            #         columns_dir, f"column_{col_index+1}_rotated.png"
-            #     )
-            #     rotated_column.save(column_rotated_path)
-            #     # logger.debug(
-            #         f"已保存旋转后的列图像到: {column_rotated_path}"
-            #     )
 
             # 计算列在模板上的位置（不同的列有不同的y起点）
             column_center_y = start_y + column_height // 2
@@ -1018,17 +740,30 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
                 column_center_y += -155
                 column_center_x += (cell_width) * 2 - 40
 
-            # 计算最终放置位置
-            final_x = column_center_x - rotated_column.width // 2 + cell_width // 2
-            final_y = column_center_y - rotated_column.height // 2
+            # 计算旋转后画布在模板上的放置位置
+            final_x = column_center_x - rotated_width // 2 + cell_width // 2
+            final_y = column_center_y - rotated_height // 2
+
+            # 模板坐标到旋转画布坐标的仿射变换
+            affine = rotation_affine(
+                rotation_angle,
+                (rotation_canvas_size / 2, rotation_canvas_size / 2),
+                origin=(
+                    -(rotated_width - rotation_canvas_size) / 2 - final_x,
+                    -(rotated_height - rotation_canvas_size) / 2 - final_y,
+                ),
+            )
+
+            # 原流程先把列以自身为遮罩贴到透明画布上，这里保留同样的透明度效果
+            column_tile = Image.new("RGBA", column_image.size, (0, 0, 0, 0))
+            column_tile.paste(column_image, (0, 0), column_image)
 
-            # 粘贴旋转后的列到结果图像
-            result.paste(rotated_column, (final_x, final_y), rotated_column)
+            # 将旋转后的列直接绘制到结果图像
+            paste_affine(result, column_tile, (paste_x, paste_y), affine)
 
         # 获取第一张图片的随机点颜色
         if poster_files:
-            first_image_path = poster_files[0]
-            random_color = get_random_color(first_image_path)
+            random_color = get_random_color(sources.get(poster_files[0]))
         else:
             # 如果没有图片，生成一个随机颜色
             random_color = (
@@ -1099,31 +834,7 @@ def create_style_multi_1(library_dir, title, font_path, font_size=(1,1), is_blur
                 result, color_block_position, color_block_size, random_color
             )
         # 保存结果
-        def image_to_base64(image, format="auto", quality=85):
-            buffer = io.BytesIO()
-            if format.lower() == "auto":
-                if image.mode == "RGBA" or (image.info.get('transparency') is not None):
-                    format = "PNG"
-                else:
-                    try:
-                        image.save(buffer, format="WEBP", quality=quality, optimize=True)
-                        base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                        return base64_str
-                    except Exception:
-                        format = "JPEG" # Fallback to JPEG if WebP fails
-            if format.lower() == "png":
-                image.save(buffer, format="PNG", optimize=True)
-                base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                return base64_str
-            elif format.lower() == "jpeg":
-                image = image.convert("RGB") # Ensure RGB for JPEG
-                image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
-                base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                return base64_str
-            else:
-                raise ValueError(f"Unsupported format: {format}")
-            
-        return image_to_base64(result)
+        return encode_image(result, output_format, encode_preset)
 
     except Exception as e:
         logger.error(f"创建多图封面时出错: {e}")
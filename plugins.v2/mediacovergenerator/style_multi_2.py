@@ -1,16 +1,21 @@
-import base64
 from collections import Counter
-import io
 from pathlib import Path
-from PIL import Image, ImageFilter, ImageDraw, ImageFont, ImageOps
+from PIL import Image, ImageDraw
 import numpy as np
 import os
 import math
 import random
 import textwrap
 from app.log import logger
-
-# 配置：使用超大画布(3200x3200)逻辑
+from app.plugins.mediacovergenerator.affine import affine_box, paste_affine, rotation_affine
+from app.plugins.mediacovergenerator.background import create_blended_background
+from app.plugins.mediacovergenerator.encoder import encode_image
+from app.plugins.mediacovergenerator.fonts import get_font
+from app.plugins.mediacovergenerator.loader import RenderSources
+from app.plugins.mediacovergenerator.masks import rounded_rect_mask
+from app.plugins.mediacovergenerator.shadows import shadow_mask, tint_shadow
+
+# 配置：海报墙按超大画布(3200x3200)排布
 POSTER_GEN_CONFIG = {
     "CANVAS_WIDTH": 1920,
     "CANVAS_HEIGHT": 1080,
@@ -20,25 +25,22 @@ POSTER_GEN_CONFIG = {
     "MARGIN_Y": 40,  # 垂直间距
     "ROTATION": -20,  # 整体旋转角度
     "CORNER_RADIUS": 25,  # 圆角
+    "SHADOW_OFFSET": 8,  # 阴影偏移
+    "SHADOW_BLUR": 12,  # 阴影模糊半径
 }
 
 
 def add_shadow(img, offset=(10, 10), shadow_color=(0, 0, 0, 140), blur_radius=15):
     """为单张图片添加阴影"""
-    shadow_width = img.width + abs(offset[0]) + blur_radius * 2
-    shadow_height = img.height + abs(offset[1]) + blur_radius * 2
-
-    # 创建大一点的画布放阴影
-    shadow_layer = Image.new("RGBA", (shadow_width, shadow_height), (0, 0, 0, 0))
-
-    # 绘制阴影实体
-    shadow_box = Image.new("RGBA", img.size, shadow_color)
-    shadow_x = blur_radius + max(0, offset[0])
-    shadow_y = blur_radius + max(0, offset[1])
-    shadow_layer.paste(shadow_box, (shadow_x, shadow_y))
-
-    # 模糊阴影
-    shadow_layer = shadow_layer.filter(ImageFilter.GaussianBlur(blur_radius))
+    # 阴影遮罩按尺寸与参数缓存，同尺寸的海报只模糊一次
+    opacity = shadow_color[3] if len(shadow_color) > 3 else 255
+    margin = (
+        blur_radius + max(0, offset[0]),
+        blur_radius + max(0, offset[1]),
+        blur_radius + max(0, -offset[0]),
+        blur_radius + max(0, -offset[1]),
+    )
+    shadow_layer = tint_shadow(shadow_mask(img.size, blur_radius, opacity, margin=margin), shadow_color)
 
     # 贴上原图
     img_x = blur_radius + max(0, -offset[0])
@@ -58,19 +60,40 @@ def add_film_grain(image, intensity=0.03):
     return Image.fromarray(img_array.astype(np.uint8), image.mode)
 
 
-def create_blur_background(image_path, width, height):
+def create_blur_background(image_source, width, height, fast_blur=False):
     """创建模糊底图"""
     try:
-        with Image.open(image_path) as img:
-            img = img.convert("RGB")
-            img = ImageOps.fit(img, (width, height), method=Image.Resampling.LANCZOS)
-            # 背景模糊一点，避免抢眼
-            return img.filter(ImageFilter.GaussianBlur(80))
+        # 背景会被大幅模糊，按画布尺寸解码即可
+        img = image_source.rgb((width, height), oversample=1)
+        # 背景模糊一点，避免抢眼
+        return create_blended_background(img, (width, height), blur_size=80, fast_blur=fast_blur)
     except:
         return Image.new("RGB", (width, height), (240, 240, 240))
 
 
-def create_style_multi_2(library_dir, title, font_path, font_size=(1, 1)):
+def create_poster_tile(poster_source, cell_w, cell_h):
+    """将单张海报裁剪为格子尺寸，添加圆角和阴影"""
+    img_resized = poster_source.fit((cell_w, cell_h))
+
+    # 圆角
+    if POSTER_GEN_CONFIG["CORNER_RADIUS"] > 0:
+        mask = rounded_rect_mask((cell_w, cell_h), POSTER_GEN_CONFIG["CORNER_RADIUS"])
+        img_rgba = img_resized.convert("RGBA")
+        img_rgba.putalpha(mask)
+        img_resized = img_rgba
+
+    # 添加阴影
+    shadow_offset = POSTER_GEN_CONFIG["SHADOW_OFFSET"]
+    piece = add_shadow(img_resized, offset=(shadow_offset, shadow_offset), blur_radius=POSTER_GEN_CONFIG["SHADOW_BLUR"])
+
+    # 先以自身为蒙版贴到透明底上，保持海报墙原有的阴影深浅
+    tile = Image.new("RGBA", piece.size, (0, 0, 0, 0))
+    tile.paste(piece, (0, 0), piece)
+    return tile
+
+
+def create_style_multi_2(library_dir, title, font_path, font_size=(1, 1), fast_blur=False,
+                         output_format="webp", encode_preset="balanced"):
     """
     风格2：全屏倾斜海报墙 + 居中标题 + 黑色加粗描边文字
     """
@@ -91,14 +114,15 @@ def create_style_multi_2(library_dir, title, font_path, font_size=(1, 1)):
 
         if not poster_files: return False
 
-        # 2. 计算大画布尺寸 (3200x3200)
+        # 2. 海报墙按 3200x3200 的虚拟画布排布，整体旋转后取中心区域作为输出
         big_w, big_h = 3200, 3200
-        big_canvas = Image.new("RGBA", (big_w, big_h), (0, 0, 0, 0))
 
         cell_w = POSTER_GEN_CONFIG["CELL_WIDTH"]
         cell_h = POSTER_GEN_CONFIG["CELL_HEIGHT"]
         margin_x = POSTER_GEN_CONFIG["MARGIN_X"]
         margin_y = POSTER_GEN_CONFIG["MARGIN_Y"]
+        shadow_pad = POSTER_GEN_CONFIG["SHADOW_OFFSET"] + POSTER_GEN_CONFIG["SHADOW_BLUR"] * 2
+        tile_size = (cell_w + shadow_pad, cell_h + shadow_pad)
 
         # 计算行列数
         cols = math.ceil(big_w / (cell_w + margin_x)) + 1
@@ -108,59 +132,47 @@ def create_style_multi_2(library_dir, title, font_path, font_size=(1, 1)):
         total_slots = cols * rows
         extended_posters = poster_files * (math.ceil(total_slots / len(poster_files)) + 1)
 
-        # 3. 绘制平铺海报
+        # 3. 模糊底图
+        # 首张海报同时用于底图和海报墙，先登记两种尺寸需要，只解码一次
+        sources = RenderSources()
+        first_source = sources.get(poster_files[0])
+        first_source.require((cw, ch), oversample=1)
+        first_source.require((cell_w, cell_h))
+        final_canvas = create_blur_background(first_source, cw, ch, fast_blur=fast_blur).convert("RGBA")
+
+        # 4. 每个格子按旋转矩阵直接绘制到输出画布，不分配虚拟大画布，视口外的格子直接跳过
+        affine = rotation_affine(POSTER_GEN_CONFIG["ROTATION"], (big_w / 2, big_h / 2),
+                                 origin=(big_w // 2 - cw // 2, big_h // 2 - ch // 2))
         idx = 0
         grid_width = cols * (cell_w + margin_x)
         grid_height = rows * (cell_h + margin_y)
         start_x = (big_w - grid_width) // 2
         start_y = (big_h - grid_height) // 2
 
+        # 每张海报只解码并生成一次圆角阴影贴片，重复出现的格子直接复用
+        tiles = {}
         for r in range(rows):
             for c in range(cols):
-                try:
-                    p_path = extended_posters[idx]
-                    idx += 1
-
-                    with Image.open(p_path) as img:
-                        img_resized = ImageOps.fit(img, (cell_w, cell_h), method=Image.Resampling.LANCZOS)
-
-                        # 圆角
-                        if POSTER_GEN_CONFIG["CORNER_RADIUS"] > 0:
-                            mask = Image.new("L", (cell_w, cell_h), 0)
-                            ImageDraw.Draw(mask).rounded_rectangle(
-                                [(0, 0), (cell_w, cell_h)],
-                                radius=POSTER_GEN_CONFIG["CORNER_RADIUS"],
-                                fill=255
-                            )
-                            img_rgba = img_resized.convert("RGBA")
-                            img_rgba.putalpha(mask)
-                            img_resized = img_rgba
-
-                        # 添加阴影
-                        final_piece = add_shadow(img_resized, offset=(8, 8), blur_radius=12)
-
-                        # 计算位置：整齐网格
-                        x = start_x + c * (cell_w + margin_x)
-                        y = start_y + r * (cell_h + margin_y)
-
-                        big_canvas.paste(final_piece, (x, y), final_piece)
-
-                except Exception as e:
+                p_path = extended_posters[idx]
+                idx += 1
+
+                # 计算位置：整齐网格
+                x = start_x + c * (cell_w + margin_x)
+                y = start_y + r * (cell_h + margin_y)
+                box = affine_box(affine, (x, y), tile_size, (cw, ch))
+                if box is None:
                     continue
 
-        # 4. 整体旋转
-        rotated_big = big_canvas.rotate(POSTER_GEN_CONFIG["ROTATION"], resample=Image.Resampling.BICUBIC)
-
-        # 5. 裁剪中心区域
-        final_canvas = create_blur_background(poster_files[0], cw, ch).convert("RGBA")
-
-        center_x = big_w // 2
-        center_y = big_h // 2
-        left = center_x - cw // 2
-        top = center_y - ch // 2
+                if p_path not in tiles:
+                    try:
+                        tiles[p_path] = create_poster_tile(sources.get(p_path), cell_w, cell_h)
+                    except Exception:
+                        tiles[p_path] = None
+                final_piece = tiles[p_path]
+                if final_piece is None:
+                    continue
 
-        crop_img = rotated_big.crop((left, top, left + cw, top + ch))
-        final_canvas.paste(crop_img, (0, 0), crop_img)
+                paste_affine(final_canvas, final_piece, (x, y), affine, box=box)
 
         # 7. 添加噪点
         final_canvas = add_film_grain(final_canvas, intensity=0.04)
@@ -170,10 +182,10 @@ def create_style_multi_2(library_dir, title, font_path, font_size=(1, 1)):
 
         # 字体
         zh_size = int(140 * float(zh_font_size_ratio))
-        zh_font = ImageFont.truetype(zh_font_path, zh_size)
+        zh_font = get_font(zh_font_path, zh_size)
 
         en_size = int(60 * float(en_font_size_ratio))
-        en_font = ImageFont.truetype(en_font_path, en_size)
+        en_font = get_font(en_font_path, en_size)
 
         # 换行逻辑
         zh_lines = textwrap.wrap(title_zh, width=12)
@@ -219,11 +231,8 @@ def create_style_multi_2(library_dir, title, font_path, font_size=(1, 1)):
             )
             cur_y += h + line_spacing
 
-        # 9. 输出
-        buffer = io.BytesIO()
-        final_rgb = final_canvas.convert("RGB")
-        final_rgb.save(buffer, format="WEBP", quality=85, optimize=True)
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        # 9. 输出（颗粒噪点也加在了 alpha 上，输出前丢弃透明通道）
+        return encode_image(final_canvas.convert("RGB"), output_format, encode_preset)
 
     except Exception as e:
         logger.error(f"Style Multi 2 Error: {e}")
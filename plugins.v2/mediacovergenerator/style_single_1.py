@@ -1,31 +1,25 @@
-import base64
 import random
 import colorsys
-from collections import Counter
-from io import BytesIO
 from pathlib import Path
 import math
 
 import numpy as np
-from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+from PIL import Image, ImageFilter
 
 from app.log import logger
+from app.plugins.mediacovergenerator.background import create_blended_background
+from app.plugins.mediacovergenerator.encoder import encode_image
+from app.plugins.mediacovergenerator.fonts import get_font
+from app.plugins.mediacovergenerator.loader import load_image
+from app.plugins.mediacovergenerator.masks import rounded_rect_mask
+from app.plugins.mediacovergenerator.palette import find_dominant_macaron_colors
+from app.plugins.mediacovergenerator.shadows import shadow_mask, tint_shadow
+from app.plugins.mediacovergenerator.textlayer import TextLayer
 
 
 # ========== 配置 ==========
 canvas_size = (1920, 1080)
 
-def is_not_black_white_gray_near(color, threshold=20):
-    """判断颜色既不是黑、白、灰，也不是接近黑、白。"""
-    r, g, b = color
-    if (r < threshold and g < threshold and b < threshold) or \
-       (r > 255 - threshold and g > 255 - threshold and b > 255 - threshold):
-        return False
-    gray_diff_threshold = 10
-    if abs(r - g) < gray_diff_threshold and abs(g - b) < gray_diff_threshold and abs(r - b) < gray_diff_threshold:
-        return False
-    return True
-
 def rgb_to_hsv(color):
     """将 RGB 颜色转换为 HSV 颜色。"""
     r, g, b = [x / 255.0 for x in color]
@@ -36,33 +30,6 @@ def hsv_to_rgb(h, s, v):
     r, g, b = colorsys.hsv_to_rgb(h, s, v)
     return (int(r * 255), int(g * 255), int(b * 255))
 
-def adjust_color_macaron(color):
-    """
-    调整颜色使其更接近马卡龙风格：
-    - 如果颜色太暗，增加亮度
-    - 如果颜色太亮，降低亮度
-    - 调整饱和度到适当范围
-    """
-    h, s, v = rgb_to_hsv(color)
-    
-    # 马卡龙风格的理想范围
-    target_saturation_range = (0.3, 0.7)  # 饱和度范围
-    target_value_range = (0.6, 0.85)      # 亮度范围
-    
-    # 调整饱和度
-    if s < target_saturation_range[0]:
-        s = target_saturation_range[0]
-    elif s > target_saturation_range[1]:
-        s = target_saturation_range[1]
-    
-    # 调整亮度
-    if v < target_value_range[0]:
-        v = target_value_range[0]  # 太暗，加亮
-    elif v > target_value_range[1]:
-        v = target_value_range[1]  # 太亮，加暗
-    
-    return hsv_to_rgb(h, s, v)
-
 def color_distance(color1, color2):
     """计算两个颜色在HSV空间中的距离"""
     h1, s1, v1 = rgb_to_hsv(color1)
@@ -74,44 +41,6 @@ def color_distance(color1, color2):
     # 综合距离，给予色调更高的权重
     return h_dist * 5 + abs(s1 - s2) + abs(v1 - v2)
 
-def find_dominant_macaron_colors(image, num_colors=5):
-    """
-    从图像中提取主要颜色并调整为马卡龙风格：
-    1. 过滤掉黑白灰颜色
-    2. 从剩余颜色中找到出现频率最高的几种
-    3. 调整这些颜色使其接近马卡龙风格
-    4. 确保提取的颜色之间有足够的差异
-    """
-    # 缩小图片以提高效率
-    img = image.copy()
-    img.thumbnail((150, 150))
-    img = img.convert('RGB')
-    pixels = list(img.getdata())
-    
-    # 过滤掉黑白灰颜色
-    filtered_pixels = [p for p in pixels if is_not_black_white_gray_near(p)]
-    if not filtered_pixels:
-        return []
-    
-    # 统计颜色出现频率
-    color_counter = Counter(filtered_pixels)
-    candidate_colors = color_counter.most_common(num_colors * 5)  # 提取更多候选颜色
-    
-    macaron_colors = []
-    min_color_distance = 0.15  # 颜色差异阈值
-    
-    for color, _ in candidate_colors:
-        # 调整为马卡龙风格
-        adjusted_color = adjust_color_macaron(color)
-        
-        # 检查与已选颜色的差异
-        if not any(color_distance(adjusted_color, existing) < min_color_distance for existing in macaron_colors):
-            macaron_colors.append(adjusted_color)
-            if len(macaron_colors) >= num_colors:
-                break
-    
-    return macaron_colors
-
 def adjust_background_color(color, darken_factor=0.85):
     """
     调整背景色，使其适合作为背景：
@@ -132,19 +61,6 @@ def darken_color(color, factor=0.7):
     r, g, b = color
     return (int(r * factor), int(g * factor), int(b * factor))
 
-def add_film_grain(image, intensity=0.05):
-    """添加胶片颗粒效果"""
-    img_array = np.array(image)
-    
-    # 创建随机噪点
-    noise = np.random.normal(0, intensity * 255, img_array.shape)
-    
-    # 应用噪点
-    img_array = img_array + noise
-    img_array = np.clip(img_array, 0, 255).astype(np.uint8)
-    
-    return Image.fromarray(img_array)
-
 def crop_to_square(img):
     """将图片裁剪为正方形"""
     width, height = img.size
@@ -159,7 +75,7 @@ def crop_to_square(img):
     
 def add_rounded_corners(img, radius=30):
     """
-    给图片添加圆角，通过超采样技术消除锯齿
+    给图片添加圆角，圆角遮罩通过超采样技术消除锯齿
     
     Args:
         img: PIL.Image对象
@@ -168,32 +84,10 @@ def add_rounded_corners(img, radius=30):
     Returns:
         带圆角的图片(RGBA模式)
     """
-    # 超采样倍数
-    factor = 2
-    
-    # 获取原始尺寸
-    width, height = img.size
-    
-    # 创建更大尺寸的空白图像（用于超采样）
-    enlarged_img = img.resize((width * factor, height * factor), Image.Resampling.LANCZOS)
-    enlarged_img = enlarged_img.convert("RGBA")
-    
-    # 创建透明蒙版，尺寸为放大后的尺寸
-    mask = Image.new('L', (width * factor, height * factor), 0)
-    draw = ImageDraw.Draw(mask)
-    
-    draw.rounded_rectangle([(0, 0), (width * factor, height * factor)], 
-                            radius=radius * factor, fill=255)
-    
-    # 创建超采样尺寸的透明背景
-    background = Image.new("RGBA", (width * factor, height * factor), (255, 255, 255, 0))
-    
-    # 使用蒙版合成图像（在高分辨率下）
-    high_res_result = Image.composite(enlarged_img, background, mask)
-    
-    # 将结果缩小回原来的尺寸，应用抗锯齿
-    result = high_res_result.resize((width, height), Image.Resampling.LANCZOS)
-    
+    # 只对遮罩做 2 倍超采样，图片本身不再放大缩小
+    mask = rounded_rect_mask(img.size, radius, supersample=2)
+    result = img.convert("RGBA")
+    result.putalpha(mask)
     return result
 
 
@@ -203,24 +97,12 @@ def add_card_shadow(img, offset=(10, 10), radius=10, opacity=0.5):
     # 获取原图尺寸
     width, height = img.size
     
-    # 创建一个更大的画布以容纳阴影和旋转后的图像
-    # 提供足够的边距，确保旋转后阴影不会被截断
+    # 提供足够的边距，确保旋转后阴影不会被截断，阴影从中心位置开始偏移
     padding = max(width, height) // 2
-    shadow = Image.new("RGBA", (width + padding * 2, height + padding * 2), (0, 0, 0, 0))
-    
-    # 在原图轮廓绘制黑色阴影，放置在中心偏移的位置
-    orig_mask = Image.new("L", (width, height), 255)
-    rounded_mask = add_rounded_corners(orig_mask, radius).convert("L")
-    
-    # 阴影位置计算，从中心位置开始偏移
-    shadow_x = padding + offset[0]
-    shadow_y = padding + offset[1]
-    shadow.paste((0, 0, 0, int(255 * opacity)), 
-                (shadow_x, shadow_y, width + shadow_x, height + shadow_y), 
-                rounded_mask)
+    margin = (padding + offset[0], padding + offset[1], padding - offset[0], padding - offset[1])
     
-    # 模糊阴影以获得更自然的效果
-    shadow = shadow.filter(ImageFilter.GaussianBlur(radius))
+    # 在原图轮廓绘制黑色阴影并模糊（遮罩按参数缓存）
+    shadow = tint_shadow(shadow_mask((width, height), radius, int(255 * opacity), corner_radius=radius, margin=margin))
     
     # 创建结果图像
     result = Image.new("RGBA", shadow.size, (0, 0, 0, 0))
@@ -233,7 +115,7 @@ def add_card_shadow(img, offset=(10, 10), radius=10, opacity=0.5):
     
     return result
 
-def add_shadow_and_rotate(canvas, img, angle, offset=(10, 10), radius=10, opacity=0.5, center_pos=None):
+def add_shadow_and_rotate(canvas, img, angle, offset=(10, 10), radius=10, opacity=0.5, center_pos=None, corner_radius=0):
     """
     先创建阴影并旋转放置，然后旋转图像并放置
     
@@ -245,6 +127,7 @@ def add_shadow_and_rotate(canvas, img, angle, offset=(10, 10), radius=10, opacit
         radius: 阴影模糊半径
         opacity: 阴影透明度
         center_pos: 放置中心位置 (x, y)
+        corner_radius: 图像的圆角半径，阴影形状与之一致（RGBA 图像有效）
         
     Returns:
         更新后的画布
@@ -256,33 +139,18 @@ def add_shadow_and_rotate(canvas, img, angle, offset=(10, 10), radius=10, opacit
     if center_pos is None:
         center_pos = (canvas.width // 2, canvas.height // 2)
     
-    # 1. 创建阴影
-    # 创建一个更大的阴影画布，给阴影留足空间，避免截断
-    padding = max(radius * 4, 100)  # 为阴影提供足够的空间
-    shadow_size = (width + padding * 2, height + padding * 2)
-    shadow = Image.new("RGBA", shadow_size, (0, 0, 0, 0))
-    
-    # 准备阴影蒙版
-    mask_size = (width, height)
-    shadow_mask = Image.new("L", mask_size, 255)  # 白色蒙版
-    
-    # 如果原图是RGBA模式，使用其透明通道作为蒙版
-    if img.mode == "RGBA":
-        shadow_mask = img.split()[3]  # 获取Alpha通道作为蒙版
-    
-    # 在阴影中心位置创建阴影形状
-    shadow_center = (padding, padding)
-    shadow.paste((0, 0, 0, int(255 * opacity)), 
-                (shadow_center[0], shadow_center[1], 
-                 shadow_center[0] + width, shadow_center[1] + height), 
-                shadow_mask)
-    
-    # 模糊阴影，使用较大的半径确保柔和效果
-    shadow = shadow.filter(ImageFilter.GaussianBlur(radius))
-    
-    # 2. 旋转阴影和图像
-    # 旋转阴影
-    rotated_shadow = rotate_image(shadow, angle)
+    # 1. 创建并旋转阴影
+    # 阴影四周留足空间，避免模糊后被截断；模糊和旋转只在 L 模式遮罩上进行，并按参数缓存
+    padding = max(radius * 4, 100)
+    mask = shadow_mask(
+        (width, height),
+        radius,
+        int(255 * opacity),
+        corner_radius=corner_radius if img.mode == "RGBA" else 0,
+        margin=(padding, padding, padding, padding),
+        angle=angle,
+    )
+    rotated_shadow = tint_shadow(mask)
     shadow_width, shadow_height = rotated_shadow.size
     
     # 计算旋转后的阴影位置（考虑偏移）
@@ -292,7 +160,7 @@ def add_shadow_and_rotate(canvas, img, angle, offset=(10, 10), radius=10, opacit
     # 将阴影粘贴到画布上
     canvas.paste(rotated_shadow, (shadow_x, shadow_y), rotated_shadow)
     
-    # 旋转原图
+    # 2. 旋转原图
     rotated_img = rotate_image(img, angle)
     img_width, img_height = rotated_img.size
     
@@ -312,7 +180,8 @@ def rotate_image(img, angle, bg_color=(0, 0, 0, 0)):
     return img.rotate(angle, Image.BICUBIC, expand=True, fillcolor=bg_color)
 
 
-def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_size=50, color_ratio=0.8):
+def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_size=50, color_ratio=0.8, fast_blur=False,
+                          output_format="webp", encode_preset="balanced"):
     try:
         zh_font_path, en_font_path = font_path
         title_zh, title_en = title
@@ -332,7 +201,7 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
         
         num_colors = 6
         # 加载原始图片
-        original_img = Image.open(image_path).convert("RGB")
+        original_img = load_image(image_path, canvas_size, "RGB")
         
         # 从图片提取马卡龙风格的颜色
         candidate_colors = find_dominant_macaron_colors(original_img, num_colors=num_colors)
@@ -367,22 +236,13 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
         bg_color = darken_color(extracted_colors[0], 0.85)  # 背景色
         card_colors = [extracted_colors[1], extracted_colors[2]]  # 卡片颜色
         
-        # 2. 背景处理
-        bg_img = original_img.copy()
-        bg_img = ImageOps.fit(bg_img, canvas_size, method=Image.LANCZOS)
-        bg_img = bg_img.filter(ImageFilter.GaussianBlur(radius=int(blur_size)))  # 强烈模糊化
-        
-        # 将背景图片与背景色混合
-        bg_img_array = np.array(bg_img, dtype=float)
-        bg_color_array = np.array([[bg_color]], dtype=float)
-        
-        # 混合背景图和颜色 (15% 背景图 + 85% 颜色)
-        blended_bg = bg_img_array * (1 - float(color_ratio)) + bg_color_array * float(color_ratio)
-        blended_bg = np.clip(blended_bg, 0, 255).astype(np.uint8)
-        blended_bg_img = Image.fromarray(blended_bg)
-        
-        # 添加胶片颗粒效果增强纹理感
-        blended_bg_img = add_film_grain(blended_bg_img, intensity=0.03)
+        # 2. 背景处理：强烈模糊化，与背景色混合 (15% 背景图 + 85% 颜色)，添加胶片颗粒效果增强纹理感
+        blended_bg_img = create_blended_background(original_img, canvas_size,
+                                                   blur_size=blur_size,
+                                                   color=bg_color,
+                                                   color_ratio=color_ratio,
+                                                   grain_intensity=0.03,
+                                                   fast_blur=fast_blur)
         
         # 创建最终画布
         canvas = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
@@ -456,18 +316,17 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
                 offset=shadow_config['offset'], 
                 radius=shadow_config['radius'], 
                 opacity=shadow_config['opacity'],
-                center_pos=center_pos
+                center_pos=center_pos,
+                corner_radius=card_size//8
             )
         
         # 将裁剪后的卡片画布与背景合并
         canvas = Image.alpha_composite(canvas.convert("RGBA"), cards_canvas)
         
         # 5. 文字处理
-        text_layer = Image.new('RGBA', canvas_size, (255, 255, 255, 0))
-        shadow_layer = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
-
-        shadow_draw = ImageDraw.Draw(shadow_layer)
-        draw = ImageDraw.Draw(text_layer)
+        # 文字和阴影图层只覆盖文字所在区域
+        text_layer = TextLayer((255, 255, 255, 0))
+        shadow_layer = TextLayer((0, 0, 0, 0))
         
         # 计算左侧区域的中心 X 位置 (画布宽度的四分之一处)
         left_area_center_x = int(canvas_size[0] * 0.25)
@@ -476,8 +335,8 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
         zh_font_size = int(canvas_size[1] * 0.17 * float(zh_font_size_ratio))
         en_font_size = int(canvas_size[1] * 0.07 * float(en_font_size_ratio))
         
-        zh_font = ImageFont.truetype(zh_font_path, zh_font_size)
-        en_font = ImageFont.truetype(en_font_path, en_font_size)
+        zh_font = get_font(zh_font_path, zh_font_size)
+        en_font = get_font(en_font_path, en_font_size)
         
         # 文字颜色和阴影颜色
         text_color = (255, 255, 255, 229)  # 85% 不透明度
@@ -486,7 +345,7 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
         shadow_alpha = 75
         
         # 计算中文标题的位置
-        zh_bbox = draw.textbbox((0, 0), title_zh, font=zh_font)
+        zh_bbox = zh_font.getbbox(title_zh)
         zh_text_w = zh_bbox[2] - zh_bbox[0]
         zh_text_h = zh_bbox[3] - zh_bbox[1]
         zh_x = left_area_center_x - zh_text_w // 2
@@ -495,14 +354,14 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
         # 中文标题阴影效果
         for offset in range(3, shadow_offset + 1, 2):
             current_shadow_color = shadow_color[:3] + (shadow_alpha,)
-            shadow_draw.text((zh_x + offset, zh_y + offset), title_zh, font=zh_font, fill=current_shadow_color)
+            shadow_layer.text((zh_x + offset, zh_y + offset), title_zh, font=zh_font, fill=current_shadow_color)
         
         # 中文标题
-        draw.text((zh_x, zh_y), title_zh, font=zh_font, fill=text_color)
+        text_layer.text((zh_x, zh_y), title_zh, font=zh_font, fill=text_color)
         
         if title_en:
             # 计算英文标题的位置
-            en_bbox = draw.textbbox((0, 0), title_en, font=en_font)
+            en_bbox = en_font.getbbox(title_en)
             en_text_w = en_bbox[2] - en_bbox[0]
             en_text_h = en_bbox[3] - en_bbox[1]
             en_x = left_area_center_x - en_text_w // 2
@@ -511,44 +370,19 @@ def create_style_single_1(image_path, title, font_path, font_size=(1,1), blur_si
             # 英文标题阴影效果
             for offset in range(2, shadow_offset // 2 + 1):
                 current_shadow_color = shadow_color[:3] + (shadow_alpha,)
-                shadow_draw.text((en_x + offset, en_y + offset), title_en, font=en_font, fill=current_shadow_color)
+                shadow_layer.text((en_x + offset, en_y + offset), title_en, font=en_font, fill=current_shadow_color)
             
             # 英文标题
-            draw.text((en_x, en_y), title_en, font=en_font, fill=text_color)
+            text_layer.text((en_x, en_y), title_en, font=en_font, fill=text_color)
         
-        blurred_shadow = shadow_layer.filter(ImageFilter.GaussianBlur(radius=shadow_offset))
-        combined = Image.alpha_composite(canvas, blurred_shadow)
-        # 合并所有图层
-        combined = Image.alpha_composite(combined, text_layer)
+        # 模糊阴影后依次合成阴影和文字
+        combined = shadow_layer.composite(canvas, blur_radius=shadow_offset)
+        combined = text_layer.composite(combined)
         
         # 转为 RGB
         # rgb_image = combined.convert("RGB")
         
-        def image_to_base64(image, format="auto", quality=85):
-            buffer = BytesIO()
-            if format.lower() == "auto":
-                if image.mode == "RGBA" or (image.info.get('transparency') is not None):
-                    format = "PNG"
-                else:
-                    try:
-                        image.save(buffer, format="WEBP", quality=quality, optimize=True)
-                        base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                        return base64_str
-                    except Exception:
-                        format = "JPEG" # Fallback to JPEG if WebP fails
-            if format.lower() == "png":
-                image.save(buffer, format="PNG", optimize=True)
-                base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                return base64_str
-            elif format.lower() == "jpeg":
-                image = image.convert("RGB") # Ensure RGB for JPEG
-                image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
-                base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-                return base64_str
-            else:
-                raise ValueError(f"Unsupported format: {format}")
-            
-        return image_to_base64(combined)
+        return encode_image(combined, output_format, encode_preset)
         
     except Exception as e:
         logger.error(f"创建单图封面时出错: {e}")
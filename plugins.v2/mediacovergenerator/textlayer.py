@@ -0,0 +1,81 @@
+"""只覆盖文字包围盒（加模糊留白）的文字与阴影图层，不再创建整幅画布大小的图层"""
+import math
+
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def blur_padding(radius):
+    """高斯模糊向外扩散的最大距离（像素），超出该范围的透明像素模糊后仍为透明"""
+    return int(math.ceil(radius * 3)) + 3 if radius > 0 else 0
+
+
+def text_box(font, xy, text):
+    """返回文字绘制在 xy 处时覆盖的整数像素区域 (left, top, right, bottom)，包含小数坐标带来的一像素余量"""
+    left, top, right, bottom = font.getbbox(text)
+    x, y = xy
+    return (math.floor(x) + left - 1, math.floor(y) + top - 1,
+            math.ceil(x) + right + 1, math.ceil(y) + bottom + 1)
+
+
+class TextLayer:
+    """
+    记录文字绘制操作，合成时在所有文字的包围盒大小的透明图层上绘制，
+    结果与在整幅画布大小的透明图层上绘制后 alpha_composite 一致
+    """
+
+    def __init__(self, background=(0, 0, 0, 0)):
+        """
+        参数:
+            background: 透明图层的底色，影响文字边缘抗锯齿像素的颜色，应与原全画布图层一致
+        """
+        self.background = background
+        self._ops = []
+
+    def text(self, xy, text, font, fill):
+        """记录一次文字绘制，参数与 ImageDraw.text 相同"""
+        if text:
+            self._ops.append((xy, text, font, fill))
+
+    def bbox(self):
+        """所有文字覆盖区域的并集，没有文字时返回 None"""
+        if not self._ops:
+            return None
+        boxes = [text_box(font, xy, text) for xy, text, font, _ in self._ops]
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def composite(self, canvas, blur_radius=0):
+        """
+        将文字（可选先高斯模糊）直接合成到 RGBA 画布上
+
+        参数:
+            canvas: RGBA 画布，会被原地修改
+            blur_radius: 高斯模糊半径，0 为不模糊
+
+        返回:
+            画布本身
+        """
+        box = self.bbox()
+        if box is None:
+            return canvas
+        pad = blur_padding(blur_radius)
+        # 图层原点不晚于任何一次绘制的起点，保证图层内坐标非负，小数部分的渲染与原位置一致
+        left = min(box[0], min(math.floor(x) for (x, _), _, _, _ in self._ops)) - pad
+        top = min(box[1], min(math.floor(y) for (_, y), _, _, _ in self._ops)) - pad
+        right, bottom = box[2] + pad, box[3] + pad
+
+        layer = Image.new("RGBA", (right - left, bottom - top), self.background)
+        draw = ImageDraw.Draw(layer)
+        for (x, y), text, font, fill in self._ops:
+            draw.text((x - left, y - top), text, font=font, fill=fill)
+        if blur_radius > 0:
+            layer = layer.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+
+        # 裁剪到画布范围内后合成
+        dest_left, dest_top = max(0, left), max(0, top)
+        dest_right, dest_bottom = min(canvas.width, right), min(canvas.height, bottom)
+        if dest_left >= dest_right or dest_top >= dest_bottom:
+            return canvas
+        source = (dest_left - left, dest_top - top, dest_right - left, dest_bottom - top)
+        canvas.alpha_composite(layer, (dest_left, dest_top), source)
+        return canvas
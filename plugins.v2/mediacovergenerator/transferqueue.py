@@ -0,0 +1,146 @@
+"""
+入库事件的延迟合并队列
+
+同一 key 的事件在安静期内合并为一组，到期后在后台线程统一处理一次，事件线程只负责入队。
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from app.log import logger
+
+
+# 同一媒体库最后一次入库后等待合并的默认时间（秒）
+LIBRARY_DEBOUNCE = 30
+
+# 分组从第一次提交起的最长等待时间（秒），持续入库时也会按时处理
+DEBOUNCE_MAX_WAIT = 600
+
+
+class DebounceQueue:
+    """
+    按 key 合并的延迟队列，线程安全
+
+    每次提交都把分组的截止时间推迟到 提交时间 + delay，但不超过第一次提交时间 + max_wait（不早于已有的截止时间）；
+    到期后调用 handler(key, values)，values 为按提交顺序排列的全部值，同一队列的分组依次处理
+    """
+
+    def __init__(self, handler, name="debounce", max_wait=DEBOUNCE_MAX_WAIT):
+        """
+        参数:
+            handler: 分组到期后的处理函数
+            name: 队列名称，用于线程名与日志
+            max_wait: 分组的最长等待时间（秒），为 None 时不限制
+        """
+        self.handler = handler
+        self.name = name
+        self.max_wait = max_wait
+        self._groups = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def _schedule(self, key, group, deadline):
+        """设置分组的截止时间，堆中旧的条目在取出时按序号识别并丢弃"""
+        group["deadline"] = deadline
+        group["seq"] = next(self._counter)
+        heapq.heappush(self._heap, (deadline, group["seq"], key))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"queue-{self.name}", daemon=True)
+            self._thread.start()
+        self._condition.notify()
+
+    def submit(self, key, value, delay=0):
+        """
+        提交一个值
+
+        返回:
+            是否新建了分组（False 表示并入了尚未到期的分组）
+        """
+        now = time.monotonic()
+        deadline = now + max(0, delay)
+        with self._condition:
+            if self._stopped:
+                return False
+            group = self._groups.get(key)
+            if group is None:
+                self._groups[key] = group = {"values": [value], "first": now}
+                self._schedule(key, group, deadline)
+                return True
+            group["values"].append(value)
+            if self.max_wait is not None:
+                deadline = min(deadline, group["first"] + self.max_wait)
+            if deadline > group["deadline"]:
+                self._schedule(key, group, deadline)
+            return False
+
+    def pending(self):
+        """尚未处理的分组数量"""
+        with self._condition:
+            return len(self._groups)
+
+    def stop(self):
+        """
+        停止处理，正在处理的分组完成后退出
+
+        返回:
+            尚未到期的分组 [(key, 分组), ...]，可交给新队列的 restore 继续处理
+        """
+        with self._condition:
+            self._stopped = True
+            groups = list(self._groups.items())
+            self._groups.clear()
+            self._heap.clear()
+            self._condition.notify_all()
+        return groups
+
+    def restore(self, groups):
+        """接收另一个队列 stop 返回的分组，保留原来的截止时间与第一次提交时间"""
+        with self._condition:
+            if self._stopped:
+                return
+            for key, old in groups:
+                group = self._groups.get(key)
+                if group is None:
+                    self._groups[key] = group = {"values": list(old["values"]), "first": old["first"]}
+                    self._schedule(key, group, old["deadline"])
+                    continue
+                group["values"][:0] = old["values"]
+                group["first"] = min(group["first"], old["first"])
+                if old["deadline"] > group["deadline"]:
+                    self._schedule(key, group, old["deadline"])
+
+    def _next_group(self):
+        """等待并取出下一个到期的分组，停止时返回 None"""
+        with self._condition:
+            while not self._stopped:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, seq, key = self._heap[0]
+                group = self._groups.get(key)
+                if group is None or group["seq"] != seq:
+                    # 截止时间已被推迟的旧条目
+                    heapq.heappop(self._heap)
+                    continue
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+                heapq.heappop(self._heap)
+                return key, self._groups.pop(key)["values"]
+            return None
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            if group is None:
+                return
+            key, values = group
+            try:
+                self.handler(key, values)
+            except Exception as err:
+                logger.error(f"处理队列 {self.name} 的分组 {key} 失败：{str(err)}")
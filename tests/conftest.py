@@ -0,0 +1,33 @@
+"""
+插件模块之间以 app.plugins.mediacovergenerator 的绝对路径导入。
+这里把该包指向仓库中的插件目录，且不执行插件的 __init__.py（它依赖 MoviePilot）。
+没有安装 MoviePilot 时，用标准库 logging 代替 app.log，测试只覆盖不依赖 MoviePilot 的模块。
+"""
+import logging
+import sys
+import types
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parents[1] / "plugins.v2" / "mediacovergenerator"
+
+
+def _package(name, path=None):
+    module = sys.modules.get(name)
+    if module is None:
+        module = types.ModuleType(name)
+        module.__path__ = []
+        sys.modules[name] = module
+    if path is not None:
+        module.__path__ = [str(path)]
+    return module
+
+
+try:
+    import app.log  # noqa: F401
+except ImportError:
+    _package("app")
+    log = types.ModuleType("app.log")
+    log.logger = logging.getLogger("mediacovergenerator")
+    sys.modules["app.log"] = log
+_package("app.plugins")
+_package("app.plugins.mediacovergenerator", PLUGIN_DIR)
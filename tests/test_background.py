@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter, ImageOps
+
+from app.plugins.mediacovergenerator.background import blur_scale_factor, fit_and_blur
+
+POSTERS = sorted((Path(__file__).resolve().parents[1] / "images").glob("*.jpg"))
+
+# 输出尺寸与插件使用的模糊半径：blur_size / blur_size_multi_1 的默认值 50，multi_2 固定 80，
+# 以及设置项允许的较小与较大取值
+SIZE = (1920, 1080)
+RADII = [20, 50, 80, 120]
+
+# 快速模糊与原尺寸模糊之间允许的最低 PSNR (dB) 与 SSIM
+PSNR_FLOOR = 40.0
+SSIM_FLOOR = 0.99
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def _box_mean(x, window):
+    """window x window 均值滤波（只取完整窗口），用积分图计算"""
+    s = np.pad(x, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (s[window:, window:] - s[:-window, window:] - s[window:, :-window] + s[:-window, :-window]) / window ** 2
+
+
+def ssim(a, b, window=8):
+    """灰度图的平均 SSIM（均匀窗口，常数取 K1=0.01、K2=0.03）"""
+    weights = np.array([0.299, 0.587, 0.114])
+    x = a.astype(np.float64) @ weights
+    y = b.astype(np.float64) @ weights
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = _box_mean(x, window), _box_mean(y, window)
+    vx = _box_mean(x * x, window) - mx * mx
+    vy = _box_mean(y * y, window) - my * my
+    cov = _box_mean(x * y, window) - mx * my
+    ssim_map = ((2 * mx * my + c1) * (2 * cov + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(ssim_map.mean())
+
+
+@pytest.fixture(scope="module", params=POSTERS, ids=lambda p: p.name)
+def poster(request):
+    with Image.open(request.param) as img:
+        return img.convert("RGB")
+
+
+def test_blur_scale_factor():
+    assert blur_scale_factor(0) == 1
+    assert blur_scale_factor(11) == 1
+    assert blur_scale_factor(12) == 2
+    assert blur_scale_factor(50) == 8
+    assert blur_scale_factor(500) == 8
+
+
+def _old_fit_and_blur(image, size, radius):
+    """改动前各风格中的背景处理：填充裁剪后按原尺寸高斯模糊"""
+    img = ImageOps.fit(image, size, method=Image.LANCZOS)
+    return img.filter(ImageFilter.GaussianBlur(radius=int(radius)))
+
+
+# 原尺寸模式与改动前结果允许的最大像素差
+EXACT_TOLERANCE = 1
+
+
+@pytest.mark.parametrize("radius", [0, 11] + RADII)
+def test_exact_mode_matches_the_old_path(poster, radius):
+    old = np.asarray(_old_fit_and_blur(poster, (640, 360), radius), dtype=np.int16)
+    exact = fit_and_blur(poster, (640, 360), radius, fast_blur=False)
+    assert exact.size == (640, 360)
+    assert np.abs(np.asarray(exact, dtype=np.int16) - old).max() <= EXACT_TOLERANCE
+    if blur_scale_factor(radius) == 1:
+        # 半径较小时快速模式不缩小，结果与原尺寸模式相同
+        fast = fit_and_blur(poster, (640, 360), radius, fast_blur=True)
+        assert np.abs(np.asarray(fast, dtype=np.int16) - old).max() <= EXACT_TOLERANCE
+
+
+@pytest.mark.parametrize("radius", RADII)
+def test_fast_blur_fidelity(poster, radius):
+    exact = np.asarray(fit_and_blur(poster, SIZE, radius, fast_blur=False))
+    fast_img = fit_and_blur(poster, SIZE, radius, fast_blur=True)
+    assert fast_img.size == SIZE
+    fast = np.asarray(fast_img)
+    assert psnr(exact, fast) >= PSNR_FLOOR
+    assert ssim(exact, fast) >= SSIM_FLOOR
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from app.plugins.mediacovergenerator import catalogue
+from app.plugins.mediacovergenerator.catalogue import LibraryCatalogue
+
+LIBRARIES = [{"Name": "电影", "Locations": ["/media/movies"]}]
+
+
+class Loader:
+    def __init__(self, result=LIBRARIES, delay=0.0):
+        self.calls = 0
+        self.result = result
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [dict(library) for library in self.result]
+
+
+def test_cached_within_ttl():
+    loader = Loader()
+    cat = LibraryCatalogue(ttl=60)
+    first = cat.get("emby", loader)
+    assert cat.get("emby", loader) is first
+    assert loader.calls == 1
+    assert (cat.hits, cat.misses) == (1, 1)
+    assert str(cat) == "命中 1 次，未命中 1 次"
+
+
+def test_zero_ttl_disables_cache():
+    loader = Loader()
+    cat = LibraryCatalogue(ttl=0)
+    cat.get("emby", loader)
+    cat.get("emby", loader)
+    assert loader.calls == 2
+
+
+def test_empty_result_is_not_cached():
+    loader = Loader(result=[])
+    cat = LibraryCatalogue(ttl=60)
+    assert cat.get("emby", loader) == []
+    assert cat.get("emby", loader) == []
+    assert loader.calls == 2
+
+
+def test_refresh_respects_min_interval(monkeypatch):
+    loader = Loader()
+    cat = LibraryCatalogue(ttl=600)
+    cat.get("emby", loader)
+    cat.get("emby", loader, refresh=True)
+    assert loader.calls == 1
+    monkeypatch.setattr(catalogue, "REFRESH_MIN_INTERVAL", 0)
+    cat.get("emby", loader, refresh=True)
+    assert loader.calls == 2
+
+
+def test_concurrent_callers_share_one_load():
+    loader = Loader(delay=0.05)
+    cat = LibraryCatalogue(ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cat.get("emby", loader))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loader.calls == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_invalidate():
+    loader = Loader()
+    cat = LibraryCatalogue(ttl=60)
+    cat.get("emby", loader)
+    cat.get("jellyfin", loader)
+    cat.invalidate("emby")
+    cat.get("emby", loader)
+    cat.get("jellyfin", loader)
+    assert loader.calls == 3
+    cat.invalidate()
+    cat.get("jellyfin", loader)
+    assert loader.calls == 4
+
+
+def test_index_is_rebuilt_only_when_the_list_reloads():
+    loader = Loader()
+    cat = LibraryCatalogue(ttl=60)
+    index = cat.get_index("emby", loader)
+    assert index.find("/media/movies/A/a.mkv")["Name"] == "电影"
+    assert cat.get_index("emby", loader) is index
+    cat.invalidate("emby")
+    assert cat.get_index("emby", loader) is not index
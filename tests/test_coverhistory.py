@@ -0,0 +1,58 @@
+from app.plugins.mediacovergenerator.coverhistory import HISTORY_SIZE, CoverHistory
+
+
+def _ids(history, server="emby", library_id="1"):
+    return [r["item_id"] for r in history.records() if r["server"] == server and r["library_id"] == library_id]
+
+
+def test_records_are_newest_first_and_bounded():
+    history = CoverHistory()
+    assert history.record("emby", 1, range(HISTORY_SIZE + 3))
+    ids = _ids(history)
+    assert ids == [str(i) for i in reversed(range(3, HISTORY_SIZE + 3))]
+    assert history.latest("emby", "1")["item_id"] == str(HISTORY_SIZE + 2)
+
+
+def test_latest_item_is_not_recorded_again():
+    history = CoverHistory()
+    history.record("emby", 1, ["a", "b"])
+    history.records()
+    assert not history.record("emby", 1, ["b"])
+    assert not history.dirty
+
+
+def test_older_item_moves_to_newest():
+    history = CoverHistory()
+    history.record("emby", 1, ["a", "b", "c"])
+    assert history.record("emby", 1, ["a"])
+    assert _ids(history) == ["a", "c", "b"]
+
+
+def test_dirty_flag_is_cleared_by_records():
+    history = CoverHistory()
+    assert not history.dirty
+    history.record("emby", 1, ["a"])
+    assert history.dirty
+    history.records()
+    assert not history.dirty
+
+
+def test_reload_keeps_order():
+    history = CoverHistory()
+    history.record("emby", 1, ["a", "b", "c"])
+    records = history.records()
+    timestamps = [r["timestamp"] for r in records]
+    assert timestamps == sorted(timestamps, reverse=True) and len(set(timestamps)) == 3
+    reloaded = CoverHistory(records)
+    assert _ids(reloaded) == ["c", "b", "a"]
+    assert not reloaded.dirty
+
+
+def test_libraries_are_keyed_by_server_and_id():
+    history = CoverHistory([
+        {"server": "emby", "library_id": 1, "item_id": 10, "timestamp": 1.0},
+        {"server": "jellyfin", "library_id": "1", "item_id": "20", "timestamp": 2.0},
+    ])
+    assert history.latest("emby", "1")["item_id"] == "10"
+    assert history.latest("jellyfin", 1)["item_id"] == "20"
+    assert history.latest("emby", "2") is None
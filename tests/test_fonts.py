@@ -0,0 +1,68 @@
+import os
+import threading
+from pathlib import Path
+
+from app.plugins.mediacovergenerator.fonts import FontCache, font_digest
+
+FONT = Path(__file__).resolve().parents[1] / "fonts" / "wendao.ttf"
+
+
+def _in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_fonts_are_reused():
+    cache = FontCache()
+    font = cache.get(FONT, 40)
+    assert cache.get(str(FONT), 40) is font
+    assert cache.get(FONT, 41) is not font
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 2}
+
+
+def test_threads_share_font_objects():
+    # 渲染线程每次运行都会重新创建，缓存需要跨线程复用
+    cache = FontCache()
+    font = cache.get(FONT, 40)
+    assert _in_thread(lambda: cache.get(FONT, 40)) is font
+    assert cache.stats()["misses"] == 1
+
+
+def test_invalidate_only_evicts_the_given_file(tmp_path):
+    other_path = tmp_path / "other.ttf"
+    other_path.write_bytes(FONT.read_bytes())
+    cache = FontCache()
+    font = cache.get(FONT, 40)
+    other = cache.get(other_path, 40)
+    cache.invalidate(other_path)
+    assert cache.get(FONT, 40) is font
+    assert cache.get(other_path, 40) is not other
+    cache.invalidate()
+    assert cache.stats()["size"] == 0
+
+
+def test_replaced_file_is_reloaded(tmp_path):
+    path = tmp_path / "font.ttf"
+    path.write_bytes(FONT.read_bytes())
+    cache = FontCache()
+    font = cache.get(path, 40)
+    path.write_bytes(FONT.read_bytes() + b"\0")
+    os.utime(path, ns=(1, 1))
+    assert cache.get(path, 40) is not font
+
+
+def test_lru_limit():
+    cache = FontCache(maxsize=2)
+    first = cache.get(FONT, 10)
+    cache.get(FONT, 11)
+    cache.get(FONT, 12)
+    assert cache.stats()["size"] == 2
+    assert cache.get(FONT, 10) is not first
+
+
+def test_font_digest():
+    assert font_digest(FONT) == font_digest(str(FONT))
+    assert font_digest(FONT.parent / "missing.ttf") is None
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from app.plugins.mediacovergenerator.gradient import (diagonal_gradient_mask, linear_gradient_mask,
+                                                      power_gradient_mask)
+
+SIZES = [(1, 1), (7, 3), (97, 13), (320, 18)]
+
+
+def _power_mask_loop(width, height, exponent):
+    """改写前 style_multi_1.create_gradient_background 中的逐像素循环"""
+    mask = Image.new("L", (width, height), 0)
+    mask.putdata([int(255.0 * (x / width) ** exponent) for y in range(height) for x in range(width)])
+    return mask
+
+
+def _linear_mask_loop(width, height, max_value):
+    """改写前 style_multi_1.create_blur_background 中逐列画线的提亮遮罩"""
+    mask = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    for x in range(width):
+        draw.line([(x, 0), (x, height)], fill=int((x / width) * max_value))
+    return mask
+
+
+def _diagonal_mask_polygon(width, height, top_x, bottom_x):
+    """改写前 style_single_2.create_diagonal_mask 的多边形绘制"""
+    mask = Image.new("L", (width, height), 255)
+    ImageDraw.Draw(mask).polygon([(top_x, 0), (width, 0), (width, height), (bottom_x, height)], fill=0)
+    return mask
+
+
+@pytest.mark.parametrize("width,height", SIZES)
+@pytest.mark.parametrize("exponent", [0.7, 1.0, 2.0])
+def test_power_gradient_matches_loop(width, height, exponent):
+    expected = np.asarray(_power_mask_loop(width, height, exponent))
+    assert np.array_equal(np.asarray(power_gradient_mask(width, height, exponent)), expected)
+
+
+@pytest.mark.parametrize("width,height", SIZES)
+@pytest.mark.parametrize("max_value", [0, 89, 255])
+def test_linear_gradient_matches_loop(width, height, max_value):
+    expected = np.asarray(_linear_mask_loop(width, height, max_value))
+    assert np.array_equal(np.asarray(linear_gradient_mask(width, height, max_value)), expected)
+
+
+@pytest.mark.parametrize("top_x,bottom_x", [(120, 60), (60, 120), (100, 100)])
+def test_diagonal_mask_differs_only_on_the_edge(top_x, bottom_x):
+    width, height = 192, 108
+    expected = np.asarray(_diagonal_mask_polygon(width, height, top_x, bottom_x)).astype(int)
+    actual = np.asarray(diagonal_gradient_mask(width, height, top_x, bottom_x)).astype(int)
+    ys, xs = np.nonzero(expected != actual)
+    boundary = top_x + (bottom_x - top_x) * ys / height
+    # 硬边遮罩只允许在分割线两侧一个像素内与多边形的光栅化结果不同
+    assert np.all(np.abs(boundary - xs) <= 1.5)
+    assert len(xs) <= 2 * height
+
+
+def test_feathered_diagonal_mask_is_monotonic():
+    mask = np.asarray(diagonal_gradient_mask(200, 50, 120, 80, feather=20)).astype(int)
+    assert np.all(np.diff(mask, axis=1) <= 0)
+    assert mask[:, 0].min() == 255 and mask[:, -1].max() == 0
@@ -0,0 +1,117 @@
+import ast
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+from app.plugins.mediacovergenerator.itemquery import (ITEM_FIELDS, ITEM_IMAGE_TYPES, ITEM_KEYS, PAGE_SIZE_MAX,
+                                                       PAGE_SIZE_MIN, QueryStats, expand_children, items_query, page_size)
+
+
+def test_items_query_requests_only_image_fields():
+    url = items_query("lib1", "DateCreated", "Movie,Series", 40, 25)
+    assert url.startswith("[HOST]emby/Items/?api_key=[APIKEY]&")
+    query = {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+    assert query == {
+        "api_key": "[APIKEY]",
+        "ParentId": "lib1",
+        "SortBy": "DateCreated",
+        "Limit": "25",
+        "StartIndex": "40",
+        "IncludeItemTypes": "Movie,Series",
+        "Recursive": "True",
+        "SortOrder": "Descending",
+        "Fields": ITEM_FIELDS,
+        "EnableImageTypes": ITEM_IMAGE_TYPES,
+        "ImageTypeLimit": "1",
+        "EnableUserData": "false",
+        "EnableTotalRecordCount": "false",
+    }
+
+
+def test_page_size_bounds():
+    assert page_size(1) == PAGE_SIZE_MIN
+    assert page_size(0) == PAGE_SIZE_MIN
+    assert page_size(10_000) == PAGE_SIZE_MAX
+
+
+def test_page_size_scales_with_valid_ratio():
+    assert page_size(16) == 20
+    assert page_size(16, 0.5) == 40
+    # 比例过低时按 VALID_RATIO_MIN 估算，比例超过 1 按 1 计算
+    assert page_size(16, 0.0) == page_size(16, 0.1) == 200
+    assert page_size(16, 5.0) == page_size(16, 1.0)
+
+
+def test_expand_children_keeps_parent_order():
+    delays = {"a": 0.05, "b": 0.0, "c": 0.02}
+
+    def fetch(parent):
+        time.sleep(delays[parent])
+        return [f"{parent}{i}" for i in range(2)]
+
+    assert expand_children(["a", "b", "c"], fetch, required=6) == ["a0", "a1", "b0", "b1", "c0", "c1"]
+
+
+def test_expand_children_returns_once_enough_leading_children_are_done():
+    started = []
+    lock = threading.Lock()
+
+    def fetch(parent):
+        with lock:
+            started.append(parent)
+        if parent >= 2:
+            time.sleep(0.05)
+        return [parent] * 3
+
+    assert expand_children(list(range(10)), fetch, required=5, concurrency=2) == [0, 0, 0, 1, 1, 1]
+    # 不足的查询被取消，不会把全部父项都查询一遍
+    time.sleep(0.2)
+    assert len(started) < 10
+
+
+def test_expand_children_treats_failures_as_empty():
+    def fetch(parent):
+        if parent == "bad":
+            raise RuntimeError("boom")
+        return [parent]
+
+    assert expand_children(["bad", "ok"], fetch, required=5) == ["ok"]
+    assert expand_children([], fetch, required=5) == []
+    assert expand_children(["ok"], fetch, required=0) == []
+
+
+def test_query_stats():
+    stats = QueryStats()
+    stats.add(SimpleNamespace(content=b"x" * 2048))
+    stats.add(None)
+    assert (stats.requests, stats.bytes) == (2, 2048)
+    assert str(stats) == "请求 2 次，共 2.0 KB"
+
+
+# 处理 emby/Items 查询结果的函数
+ITEM_FUNCTIONS = {"__filter_valid_items", "__get_image_ref", "__get_item_id", "__handle_container_library"}
+
+
+def _item_keys(source):
+    """这些函数中以 item["X"] 或 item.get("X") 读取的键"""
+    keys = set()
+    functions = [node for node in ast.walk(ast.parse(source))
+                 if isinstance(node, ast.FunctionDef) and node.name in ITEM_FUNCTIONS]
+    assert {function.name for function in functions} == ITEM_FUNCTIONS
+    for node in (node for function in functions for node in ast.walk(function)):
+        if isinstance(node, ast.Subscript):
+            target, key = node.value, node.slice
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "get" and node.args:
+            target, key = node.func.value, node.args[0]
+        else:
+            continue
+        if isinstance(target, ast.Name) and target.id == "item" and isinstance(key, ast.Constant):
+            keys.add(key.value)
+    return keys
+
+
+def test_render_path_reads_only_documented_item_keys():
+    source = (Path(__file__).resolve().parents[1] / "plugins.v2" / "mediacovergenerator" / "__init__.py").read_text()
+    assert _item_keys(source) == set(ITEM_KEYS)
@@ -0,0 +1,53 @@
+from app.plugins.mediacovergenerator.libraryindex import LibraryIndex, split_path
+
+
+def _library(name, *locations):
+    return {"Name": name, "Locations": list(locations)}
+
+
+def test_split_path_accepts_both_separators():
+    assert split_path("/media//tv/") == ["media", "tv"]
+    assert split_path("D:\\Media\\TV") == ["D:", "Media", "TV"]
+
+
+def test_deepest_location_wins():
+    media = _library("媒体", "/media")
+    anime = _library("动漫", "/media/tv/anime")
+    tv = _library("电视剧", "/media/tv")
+    index = LibraryIndex([media, anime, tv])
+    assert index.find("/media/tv/anime/海贼王/S01E01.mkv") is anime
+    assert index.find("/media/tv/庆余年/S01E01.mkv") is tv
+    assert index.find("/media/movie/a.mkv") is media
+
+
+def test_locations_match_on_whole_components():
+    tv = _library("电视剧", "/media/tv")
+    tv2 = _library("电视剧2", "/media/tv2")
+    index = LibraryIndex([tv, tv2])
+    assert index.find("/media/tv2/a/b.mkv") is tv2
+    assert index.find("/media/tv/a/b.mkv") is tv
+    assert index.find("/media/tvshow/a.mkv") is None
+    assert index.find("/media") is None
+
+
+def test_windows_paths_and_trailing_separators():
+    movie = _library("电影", "D:\\Media\\Movie\\")
+    index = LibraryIndex([movie])
+    assert index.find("D:\\Media\\Movie\\a\\a.mkv") is movie
+    assert index.find("D:/Media/Movie/b.mkv") is movie
+
+
+def test_first_library_wins_for_a_shared_location():
+    first = _library("电影", "/media/movie")
+    second = _library("电影 4K", "/media/movie")
+    assert LibraryIndex([first, second]).find("/media/movie/a.mkv") is first
+
+
+def test_root_location_and_empty_input():
+    root = _library("全部", "/")
+    assert LibraryIndex([root]).find("/any/path.mkv") is root
+    index = LibraryIndex([_library("无目录"), {"Name": "空", "Locations": None}])
+    assert index.find("/media/a.mkv") is None
+    assert index.find("") is None
+    assert index.find(None) is None
+    assert LibraryIndex(None).find("/media/a.mkv") is None
@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from app.plugins.mediacovergenerator import loader
+from app.plugins.mediacovergenerator.loader import ImageSource, RenderSources
+
+FONT = str(Path(__file__).resolve().parents[1] / "fonts" / "wendao.ttf")
+
+
+def _poster(path, size=(2000, 3000)):
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (30, 20, 3), dtype=np.uint8)
+    Image.fromarray(small).resize(size, Image.BILINEAR).save(path, quality=85)
+    return path
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """按文件统计解码次数与解码尺寸"""
+    calls = {}
+    load_image = loader.load_image
+
+    def counting(image_path, *args, **kwargs):
+        image = load_image(image_path, *args, **kwargs)
+        calls.setdefault(Path(image_path).name, []).append(image.size)
+        return image
+    monkeypatch.setattr(loader, "load_image", counting)
+    return calls
+
+
+def test_registered_requirements_decode_once(tmp_path, decodes):
+    source = ImageSource(_poster(tmp_path / "1.jpg"))
+    source.require((100, 100), scale_mode="contain")
+    source.require((400, 600))
+    thumb = source.thumbnail((100, 100))
+    fitted = source.fit((400, 600))
+    source.rgb((400, 600))
+    assert len(decodes["1.jpg"]) == 1
+    # draft 只按整数倍缩小，解码尺寸不小于所需尺寸的 DRAFT_OVERSAMPLE 倍
+    assert decodes["1.jpg"][0][0] < 2000
+    assert thumb.size == (67, 100)
+    assert fitted.size == (400, 600)
+
+
+def test_larger_requirement_decodes_again(tmp_path, decodes):
+    source = ImageSource(_poster(tmp_path / "1.jpg"))
+    source.rgb((100, 150))
+    source.rgb()
+    assert len(decodes["1.jpg"]) == 2
+    assert decodes["1.jpg"][-1] == (2000, 3000)
+
+
+def test_views_match_direct_pil(tmp_path):
+    path = _poster(tmp_path / "1.jpg", (600, 900))
+    source = RenderSources().get(path)
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        expected = ImageOps.fit(image, (200, 300), method=Image.Resampling.LANCZOS)
+    assert np.abs(np.asarray(source.fit((200, 300)), int) - np.asarray(expected, int)).max() <= 2
+
+
+def test_same_path_shares_one_source(tmp_path):
+    path = _poster(tmp_path / "1.jpg", (60, 90))
+    sources = RenderSources()
+    assert sources.get(path) is sources.get(str(tmp_path / "." / "1.jpg"))
+
+
+@pytest.mark.parametrize("is_blur", [False, True])
+def test_style_multi_1_decodes_each_poster_once(tmp_path, decodes, is_blur):
+    from app.plugins.mediacovergenerator.style_multi_1 import create_style_multi_1
+
+    # 首图足够大时，两种背景都可以按缩小后的尺寸解码
+    _poster(tmp_path / "1.jpg", (4000, 6000))
+    _poster(tmp_path / "2.jpg")
+    for i in range(3, 10):
+        (tmp_path / f"{i}.jpg").write_bytes((tmp_path / "2.jpg").read_bytes())
+    result = create_style_multi_1(str(tmp_path), ("电影", "Movies"), (FONT, FONT), is_blur=is_blur,
+                                  output_format="jpeg", encode_preset="fast")
+    assert result
+    assert sorted(decodes) == [f"{i}.jpg" for i in range(1, 10)]
+    assert all(len(sizes) == 1 for sizes in decodes.values()), decodes
+    assert decodes["1.jpg"][0] != (4000, 6000)
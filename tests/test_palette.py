@@ -0,0 +1,83 @@
+import colorsys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.plugins.mediacovergenerator.palette import (find_dominant_macaron_colors, find_dominant_vibrant_colors,
+                                                     get_poster_primary_color, hsv_to_rgb_array,
+                                                     most_common_colors, not_black_white_gray_mask,
+                                                     rgb_to_hsv_array)
+
+# 仓库自带的封面预览图，由真实海报合成
+POSTERS = sorted((Path(__file__).resolve().parents[1] / "images").glob("*.jpg"))
+
+
+def _is_not_black_white_gray_near(color, threshold=20):
+    """改写前 style_single_1 中的逐像素过滤"""
+    r, g, b = color
+    if (r < threshold and g < threshold and b < threshold) or \
+            (r > 255 - threshold and g > 255 - threshold and b > 255 - threshold):
+        return False
+    return not (abs(r - g) < 10 and abs(g - b) < 10 and abs(r - b) < 10)
+
+
+def _thumbnail_pixels(path, size):
+    img = Image.open(path)
+    img.thumbnail(size)
+    return np.asarray(img.convert("RGB"), dtype=np.uint8).reshape(-1, 3)
+
+
+@pytest.fixture(params=POSTERS, ids=lambda p: p.name)
+def poster(request):
+    return request.param
+
+
+def test_posters_are_bundled():
+    assert len(POSTERS) >= 4
+
+
+def test_filter_matches_old_loop(poster):
+    pixels = _thumbnail_pixels(poster, (150, 150))
+    expected = [_is_not_black_white_gray_near(tuple(int(v) for v in p)) for p in pixels]
+    assert not_black_white_gray_mask(pixels).tolist() == expected
+
+
+def test_unquantized_counts_match_counter(poster):
+    pixels = _thumbnail_pixels(poster, (150, 150))
+    pixels = pixels[not_black_white_gray_mask(pixels)]
+    expected = Counter(tuple(int(v) for v in p) for p in pixels).most_common(25)
+    assert most_common_colors(pixels, 25, bits=8) == expected
+
+
+def test_quantized_buckets_cover_all_pixels(poster):
+    pixels = _thumbnail_pixels(poster, (100, 100))
+    colors = most_common_colors(pixels, len(pixels), bits=5)
+    assert sum(n for _, n in colors) == len(pixels)
+    counts = [n for _, n in colors]
+    assert counts == sorted(counts, reverse=True)
+
+
+def test_hsv_conversion_matches_colorsys():
+    rng = np.random.default_rng(3)
+    rgb = rng.integers(0, 256, size=(2000, 3))
+    rgb[:10] = [[0, 0, 0], [255, 255, 255], [128, 128, 128], [255, 0, 0], [0, 255, 0],
+                [0, 0, 255], [255, 255, 0], [0, 255, 255], [255, 0, 255], [1, 2, 3]]
+    expected_hsv = [colorsys.rgb_to_hsv(*(c / 255.0 for c in color)) for color in rgb]
+    hsv = rgb_to_hsv_array(rgb)
+    assert np.allclose(hsv, expected_hsv, atol=1e-12)
+    expected_rgb = [[int(c * 255) for c in colorsys.hsv_to_rgb(*color)] for color in expected_hsv]
+    assert hsv_to_rgb_array(hsv).tolist() == expected_rgb
+
+
+def test_palette_structures(poster):
+    image = Image.open(poster)
+    for colors in (find_dominant_vibrant_colors(image), find_dominant_macaron_colors(image)):
+        assert 0 < len(colors) <= 5
+        assert all(len(c) == 3 and all(isinstance(v, int) and 0 <= v <= 255 for v in c) for c in colors)
+        assert len(set(colors)) == len(colors)
+    primary = get_poster_primary_color(str(poster))
+    assert 0 < len(primary) <= 10
+    assert all(len(color) == 4 and color[3] == 255 and count > 0 for color, count in primary)
@@ -0,0 +1,68 @@
+import queue
+import threading
+import time
+
+from app.plugins.mediacovergenerator.pipeline import _DONE, Pipeline
+
+
+def _stage(log, name, delay=0.0, result=True):
+    def run(value):
+        log.append((name, value, "start"))
+        time.sleep(delay)
+        log.append((name, value, "end"))
+        return value if result else None
+    return name, run
+
+
+def test_results_keep_order_and_skip_failed_tasks():
+    log = []
+    stages = [_stage(log, "fetch"), ("render", lambda v: v * 10 if v != 2 else None), _stage(log, "upload")]
+    assert Pipeline(stages).run([1, 2, 3]) == [10, 30]
+
+
+def test_same_key_is_exclusive_until_the_given_stage():
+    log = []
+    stages = [_stage(log, "fetch", 0.02), _stage(log, "render", 0.02), _stage(log, "upload", 0.05)]
+    pipeline = Pipeline(stages, key=lambda v: v[0], exclusive_until=1)
+    pipeline.run([("a", 1), ("a", 2), ("b", 3)])
+    # 第二个 a 的下载在第一个 a 离开渲染阶段之后才开始
+    assert log.index(("render", ("a", 1), "end")) < log.index(("fetch", ("a", 2), "start"))
+
+
+def test_stopped_task_does_not_release_a_key_it_never_held():
+    stop_event = threading.Event()
+    rendering = threading.Event()
+    release = threading.Event()
+    fetched = []
+
+    def render(value):
+        rendering.set()
+        release.wait(2)
+        return value
+
+    pipeline = Pipeline([("fetch", lambda v: fetched.append(v) or v), ("render", render)],
+                        stop_event=stop_event, key=lambda v: "same", exclusive_until=1)
+    thread = threading.Thread(target=pipeline.run, args=([1, 2],))
+    thread.start()
+    assert rendering.wait(2)
+    # 任务 1 渲染中持有 key，任务 2 在第 0 阶段等待；停止后任务 2 放弃，但不能释放任务 1 的 key
+    time.sleep(0.1)
+    stop_event.set()
+    time.sleep(0.7)
+    assert "same" in pipeline._active_keys
+    release.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert fetched == [1]
+    assert not pipeline._active_keys
+
+
+def test_task_queued_after_stop_leaves_held_keys_alone():
+    pipeline = Pipeline([("fetch", lambda v: v), ("render", lambda v: v)], key=lambda v: v, exclusive_until=1)
+    pipeline._active_keys.add("x")
+    pipeline.stop_event.set()
+    inbox = queue.Queue()
+    inbox.put(("x", "x"))
+    inbox.put(_DONE)
+    pipeline._worker(0, inbox, None, [])
+    assert "x" in pipeline._active_keys
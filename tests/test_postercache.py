@@ -0,0 +1,70 @@
+import os
+
+from app.plugins.mediacovergenerator.postercache import PosterCache
+
+
+def _key(item_id, tag="t1"):
+    return PosterCache.make_key("emby", item_id, "Primary", tag)
+
+
+def test_make_key():
+    assert _key(0) == ("emby", "0", "Primary", "t1")
+    assert _key(None) is None
+    assert _key("") is None
+    assert _key("1", tag="") is None
+
+
+def test_put_and_get(tmp_path):
+    cache = PosterCache(tmp_path)
+    assert cache.get(_key(1)) is None
+    cache.put(_key(1), b"poster")
+    assert cache.get(_key(1)) == b"poster"
+    # tag 变化视为新图片
+    assert cache.get(_key(1, tag="t2")) is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "count": 1, "bytes": 6}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PosterCache(tmp_path, max_bytes=30)
+    for item_id in range(3):
+        cache.put(_key(item_id), bytes(10))
+    # 读取 0 号后它变为最近使用，再写入时淘汰 1 号
+    assert cache.get(_key(0)) is not None
+    cache.put(_key(3), bytes(10))
+    assert cache.get(_key(1)) is None
+    assert all(cache.get(_key(item_id)) is not None for item_id in (0, 2, 3))
+    assert cache.stats()["bytes"] == 30
+
+
+def test_overwrite_does_not_double_count(tmp_path):
+    cache = PosterCache(tmp_path, max_bytes=100)
+    cache.put(_key(1), bytes(40))
+    cache.put(_key(1), bytes(50))
+    assert cache.stats()["bytes"] == 50
+    assert cache.get(_key(1)) == bytes(50)
+
+
+def test_oversized_content_is_not_cached(tmp_path):
+    cache = PosterCache(tmp_path, max_bytes=10)
+    cache.put(_key(1), bytes(11))
+    assert cache.stats()["count"] == 0
+
+
+def test_reload_keeps_lru_order_and_removes_partial_writes(tmp_path):
+    cache = PosterCache(tmp_path, max_bytes=30)
+    for item_id in range(3):
+        cache.put(_key(item_id), bytes(10))
+    paths = [cache._path(_key(item_id)) for item_id in range(3)]
+    for age, path in zip((300, 100, 200), paths):
+        os.utime(path, (1_000_000 - age, 1_000_000 - age))
+    leftover = os.path.join(os.path.dirname(paths[0]), "partial.img.1.tmp")
+    with open(leftover, "wb") as f:
+        f.write(b"x")
+
+    reloaded = PosterCache(tmp_path, max_bytes=30)
+    assert reloaded.stats()["count"] == 3
+    assert not os.path.exists(leftover)
+    # 修改时间最早的 0 号最先被淘汰
+    reloaded.put(_key(3), bytes(10))
+    assert reloaded.get(_key(0)) is None
+    assert reloaded.get(_key(1)) is not None and reloaded.get(_key(2)) is not None
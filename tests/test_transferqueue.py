@@ -0,0 +1,90 @@
+import queue
+import time
+
+from app.plugins.mediacovergenerator.transferqueue import DebounceQueue
+
+
+def _queue(**kwargs):
+    handled = queue.Queue()
+    debounce = DebounceQueue(lambda key, values: handled.put((key, values, time.monotonic())), **kwargs)
+    return debounce, handled
+
+
+def test_values_of_the_same_key_are_merged_in_order():
+    debounce, handled = _queue()
+    assert debounce.submit("a", 1, delay=0.1)
+    assert not debounce.submit("a", 2, delay=0.1)
+    assert debounce.submit("b", 3, delay=0.05)
+    assert handled.get(timeout=1)[:2] == ("b", [3])
+    assert handled.get(timeout=1)[:2] == ("a", [1, 2])
+    assert debounce.pending() == 0
+    debounce.stop()
+
+
+def test_each_submit_pushes_the_deadline_forward():
+    debounce, handled = _queue()
+    debounce.submit("a", 1, delay=0.2)
+    time.sleep(0.15)
+    last = time.monotonic()
+    debounce.submit("a", 2, delay=0.2)
+    key, values, at = handled.get(timeout=1)
+    assert values == [1, 2]
+    assert at - last >= 0.19
+    debounce.stop()
+
+
+def test_max_wait_caps_a_group_that_keeps_receiving_values():
+    debounce, handled = _queue(max_wait=0.3)
+    first = time.monotonic()
+    for i in range(8):
+        debounce.submit("a", i, delay=0.15)
+        time.sleep(0.05)
+    key, values, at = handled.get(timeout=1)
+    # 持续提交时分组按最长等待时间处理，之后的值进入新的分组
+    assert values[:6] == list(range(6)) and len(values) < 8
+    assert 0.29 <= at - first < 0.4
+    debounce.stop()
+
+
+def test_shorter_delay_does_not_pull_the_deadline_back():
+    debounce, handled = _queue()
+    start = time.monotonic()
+    debounce.submit("a", 1, delay=0.2)
+    debounce.submit("a", 2, delay=0)
+    key, values, at = handled.get(timeout=1)
+    assert values == [1, 2]
+    assert at - start >= 0.19
+    debounce.stop()
+
+
+def test_stop_returns_pending_groups_and_restore_keeps_their_deadline():
+    old, old_handled = _queue()
+    old.submit("a", 1, delay=0.2)
+    old.submit("a", 2, delay=0.2)
+    groups = old.stop()
+    assert not old.submit("a", 3, delay=0)
+    assert [(key, group["values"]) for key, group in groups] == [("a", [1, 2])]
+
+    new, handled = _queue()
+    new.submit("a", 4, delay=0.1)
+    new.restore(groups)
+    key, values, at = handled.get(timeout=1)
+    assert values == [1, 2, 4]
+    assert at >= groups[0][1]["deadline"]
+    assert old_handled.empty()
+    new.stop()
+
+
+def test_handler_errors_do_not_stop_the_queue():
+    handled = queue.Queue()
+
+    def handler(key, values):
+        if key == "bad":
+            raise ValueError("boom")
+        handled.put(key)
+
+    debounce = DebounceQueue(handler)
+    debounce.submit("bad", 1)
+    debounce.submit("good", 2, delay=0.05)
+    assert handled.get(timeout=1) == "good"
+    debounce.stop()